@@ -1,20 +1,81 @@
 from flask import Flask, jsonify
-from app.extensions import mongo, jwt
+from app.extensions import mongo, async_mongo, jwt, cache, events, ingest, pool_monitor, metrics, slow_queries, profiler, heatmap_cube, resilience
 from flask_cors import CORS
+from pymongo.errors import PyMongoError
+from app.cli import register_commands
+from app.indexes import ensure_indexes
+from app.json_provider import MongoJSONProvider
 from app.routes.auth_routes import auth_bp
 from app.routes.report_routes import report_bp
 from .routes.admin_update_routes import admin_bp
 from .routes.analytics_routes import analytics_bp
 from .routes.discussion_routes import discussion_bp
+from .routes.stream_routes import stream_bp
+from .routes.health_routes import health_bp
+from .routes.dashboard_routes import dashboard_bp
+from .routes.facility_routes import facility_bp
+from .routes.metrics_routes import metrics_bp
+from .routes.diagnostics_routes import diagnostics_bp
+from app.facilities import registry as facility_registry
+
+
+def command_listeners(app):
+    """pymongo command listeners the configuration turns on, for both clients."""
+    listeners = []
+    if app.config['METRICS_ENABLED']:
+        listeners.append(metrics)
+    if app.config['SLOW_QUERY_MS'] > 0:
+        listeners.append(slow_queries)
+    return listeners
+
+
+def init_mongo(app):
+    """
+    Create the MongoClient. Called by create_app and again in every
+    gunicorn worker after fork, since a client must not be shared across
+    processes.
+    """
+    pool_monitor.reset()
+    metrics.reset()
+    mongo.init_app(
+        app,
+        minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+        maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+        serverSelectionTimeoutMS=app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        event_listeners=[pool_monitor, *command_listeners(app)],
+    )
+    # Replaces the extended-JSON provider Flask-PyMongo installs
+    app.json = MongoJSONProvider(app)
 
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object('app.config.Config')
-    CORS(app)
+    CORS(app, expose_headers=['X-Next-Cursor', 'ETag', 'Last-Modified', 'X-Data-Stale', 'Age', 'Warning', 'X-Profile-Id'])
 
-    mongo.init_app(app)
+    init_mongo(app)
+    async_mongo.init_app(app, event_listeners=command_listeners(app))
+    metrics.init_app(app)
+    slow_queries.init_app(app)
+    profiler.init_app(app)
     jwt.init_app(app)
+    cache.init_app(app)
+    events.init_app(app)
+    ingest.init_app(app)
+    heatmap_cube.init_app(app)
+    resilience.init_app(app)
+    facility_registry.init_app(app)
+    register_commands(app)
+
+    if app.config['MONGO_ENSURE_INDEXES']:
+        try:
+            created, failed = ensure_indexes(mongo.db)
+            for name in created:
+                app.logger.info("Created index %s", name)
+            for name, error in failed.items():
+                app.logger.warning("Could not create index %s: %s", name, error)
+        except PyMongoError as e:
+            app.logger.warning("Skipping index creation, MongoDB unavailable: %s", e)
 
     # JWT Error Handlers - only for required JWT endpoints
     @jwt.expired_token_loader
@@ -41,4 +102,10 @@ def create_app():
     app.register_blueprint(admin_bp)
     app.register_blueprint(analytics_bp)
     app.register_blueprint(discussion_bp)
+    app.register_blueprint(stream_bp)
+    app.register_blueprint(health_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(facility_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(diagnostics_bp)
     return app
@@ -0,0 +1,114 @@
+"""
+Asynchronous MongoDB access for routes that need several independent
+queries.
+
+Each process runs one asyncio event loop on a background thread, holding a
+single `pymongo.AsyncMongoClient`. Views stay synchronous: they hand
+coroutines to the loop with `run`/`gather` and wait for the result, so the
+queries of one request are in flight together and the loop overlaps the
+I/O of every request in the worker over one connection pool.
+
+    discussion, page = async_mongo.gather(
+        async_mongo.db.discussions.find_one({"_id": discussion_id}),
+        comments_page(discussion_id),
+    )
+
+Coroutines passed in run on the loop thread; anything they touch must be
+safe to use from there (no `request`, `g` or `mongo.db`). They carry the
+route of the request that submitted them, which `current_route` returns
+there, so command listeners can attribute their queries.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from flask import has_request_context, request
+from pymongo import AsyncMongoClient, uri_parser
+
+# "METHOD /rule" of the request a coroutine on the loop was submitted by
+_route = contextvars.ContextVar("async_mongo_route", default=None)
+
+
+def current_route():
+    """"METHOD /rule" of the current request, also on the loop thread; None outside requests."""
+    if has_request_context():
+        return f"{request.method} {request.url_rule.rule if request.url_rule is not None else request.path}"
+    return _route.get()
+
+
+async def _in_route(route, coroutine):
+    # Runs as the loop's task for `coroutine`: the variable is set in that task's context
+    _route.set(route)
+    return await coroutine
+
+
+class AsyncMongo:
+
+    def __init__(self):
+        self._client = None
+        self._db = None
+        self.timeout = 30
+        self._uri = None
+        self._options = {}
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, event_listeners=()):
+        self._uri = app.config['MONGO_URI']
+        self._options = {
+            "minPoolSize": app.config['MONGO_MIN_POOL_SIZE'],
+            "maxPoolSize": app.config['MONGO_MAX_POOL_SIZE'],
+            "serverSelectionTimeoutMS": app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+            "event_listeners": list(event_listeners),
+        }
+        self.timeout = app.config.get('MONGO_ASYNC_TIMEOUT_SECONDS', 30)
+
+    def _ensure_started(self):
+        # The loop thread does not survive a fork: every worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="async-mongo", daemon=True).start()
+            self._loop = loop
+            self._client = self._submit(self._connect()).result()
+            database = uri_parser.parse_uri(self._uri)["database"]
+            self._db = self._client[database] if database else None
+            self._pid = os.getpid()
+
+    async def _connect(self):
+        # Created on the loop so the client is bound to it
+        return AsyncMongoClient(self._uri, **self._options)
+
+    @property
+    def client(self):
+        self._ensure_started()
+        return self._client
+
+    @property
+    def db(self):
+        """The AsyncDatabase named in MONGO_URI."""
+        self._ensure_started()
+        return self._db
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine):
+        """Run `coroutine` on the loop and return its result."""
+        self._ensure_started()
+        future = self._submit(_in_route(current_route(), coroutine))
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def gather(self, *coroutines):
+        """Run `coroutines` concurrently and return their results in order."""
+        async def gather():
+            return await asyncio.gather(*coroutines)
+        return self.run(gather())
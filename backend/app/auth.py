@@ -0,0 +1,16 @@
+"""Access checks shared by routes."""
+from functools import wraps
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+
+def admin_required(view):
+    """Require a token whose identity has the "admin" role; 403 otherwise."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        identity = get_jwt_identity()
+        if not isinstance(identity, dict) or identity.get('role') != 'admin':
+            return jsonify({"error": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
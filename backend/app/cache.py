@@ -0,0 +1,209 @@
+"""
+Response caching for read-heavy endpoints.
+
+    @analytics_bp.route('/api/heatmap')
+    @cache.cached('reports')
+    def get_heatmap_data(): ...
+
+caches the response per endpoint and query string. Each cached entry
+depends on one or more namespaces ("reports", "discussions"); write routes
+call `cache.invalidate('reports')`, which bumps that namespace's version so
+only the dependent entries stop matching. Responses carry an ETag and a
+Last-Modified (the time of the last relevant write) so polling clients get
+304s.
+
+Backends: "simple" (in-process TTL/LRU, the default), "redis" (shared
+between workers, needs the `redis` package and CACHE_REDIS_URL) and "none".
+Versions of the simple backend are per process, so an invalidation only
+reaches the worker that made the write; with several workers its entries
+are capped at CACHE_SIMPLE_MAX_TIMEOUT seconds. Use redis to cache longer.
+
+Concurrent misses for the same entry, at the same namespace versions, are
+coalesced (see single_flight), so a burst of identical requests runs the
+view once.
+"""
+import hashlib
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, make_response
+from app.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:  # only needed for CACHE_BACKEND=redis
+    redis = None
+
+
+class SimpleCache:
+    """Thread-safe in-process cache with per-entry TTL and LRU eviction."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_version(self, namespace):
+        with self._lock:
+            return self._versions.setdefault(namespace, time.time_ns())
+
+    def bump_version(self, namespace):
+        with self._lock:
+            self._versions[namespace] = max(time.time_ns(), self._versions.get(namespace, 0) + 1)
+
+
+class RedisCache:
+    """Cache shared by every worker through Redis."""
+
+    def __init__(self, url, prefix='periodpal:cache:'):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, timeout):
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=max(int(timeout), 1))
+
+    def get_version(self, namespace):
+        key = f"{self.prefix}version:{namespace}"
+        self._client.set(key, time.time_ns(), nx=True)
+        return int(self._client.get(key))
+
+    def bump_version(self, namespace):
+        self._client.set(f"{self.prefix}version:{namespace}", time.time_ns())
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def get_version(self, namespace):
+        return 0
+
+    def bump_version(self, namespace):
+        pass
+
+
+class ResponseCache:
+
+    def __init__(self):
+        self.backend = NullCache()
+        self.default_timeout = 60
+        self.max_timeout = None
+        self.single_flight = SingleFlight()
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'simple')
+        if backend == 'simple':
+            self.backend = SimpleCache(app.config.get('CACHE_MAX_ENTRIES', 512))
+        elif backend == 'redis':
+            self.backend = RedisCache(app.config['CACHE_REDIS_URL'])
+        else:
+            self.backend = NullCache()
+        self.default_timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+        self.max_timeout = None
+        if backend == 'simple' and app.config.get('WEB_WORKERS', 1) > 1:
+            self.max_timeout = app.config.get('CACHE_SIMPLE_MAX_TIMEOUT', 15)
+            logger.warning(
+                "CACHE_BACKEND=simple with %d workers: cached responses live at most %ss, "
+                "use CACHE_BACKEND=redis to share invalidations", app.config['WEB_WORKERS'], self.max_timeout
+            )
+        self.single_flight = SingleFlight(
+            lock_dir=app.config.get('SINGLE_FLIGHT_LOCK_DIR') or None,
+            timeout=app.config.get('SINGLE_FLIGHT_TIMEOUT_SECONDS', 30),
+        )
+
+    def invalidate(self, *namespaces):
+        """Drop every cached response that depends on any of `namespaces`."""
+        for namespace in namespaces:
+            self.backend.bump_version(namespace)
+
+    def versions(self, namespaces):
+        return [self.backend.get_version(namespace) for namespace in namespaces]
+
+    def cached(self, *namespaces, timeout=None):
+        """Cache successful responses of the decorated view, see module docstring."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                versions = self.versions(namespaces)
+                key = "|".join([
+                    request.endpoint,
+                    repr(sorted(kwargs.items())),
+                    repr(sorted(request.args.items(multi=True))),
+                    *map(str, versions),
+                ])
+
+                def compute():
+                    # Another request may have filled the entry while this one waited
+                    entry = self.backend.get(key)
+                    if entry is not None:
+                        return entry
+                    response = make_response(view(*args, **kwargs))
+                    body = response.get_data()
+                    entry = {"body": body, "mimetype": response.mimetype, "status": response.status_code}
+                    if response.status_code != 200:
+                        # Shared with the requests waiting on this one, never stored
+                        return entry
+                    entry.update({
+                        "etag": hashlib.blake2b(body, digest_size=16).hexdigest(),
+                        "modified": max(versions, default=time.time_ns()),
+                    })
+                    lifetime = timeout or self.default_timeout
+                    if self.max_timeout is not None:
+                        lifetime = min(lifetime, self.max_timeout)
+                    self.backend.set(key, entry, lifetime)
+                    return entry
+
+                entry = self.backend.get(key)
+                if entry is None:
+                    # Identical requests that miss together share one computation.
+                    # Keyed with the versions: a request made after an invalidation
+                    # must not get the result of a flight that started before it
+                    entry = self.single_flight.do(key, compute)
+                if entry.get("status", 200) != 200:
+                    return make_response(entry["body"], entry["status"], {"Content-Type": entry["mimetype"]})
+
+                response = make_response(entry["body"], 200)
+                response.mimetype = entry["mimetype"]
+                response.set_etag(entry["etag"])
+                response.last_modified = datetime.fromtimestamp(entry["modified"] / 1e9, timezone.utc)
+                # Let browsers keep the body but revalidate on every poll
+                response.cache_control.no_cache = True
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
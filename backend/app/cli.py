@@ -0,0 +1,57 @@
+import click
+from app.extensions import mongo
+from app.indexes import ensure_indexes, unsupported_query_shapes, explain_query_shapes
+from app.migrations import run_migrations, migration_status
+from app import location_status
+
+
+def register_commands(app):
+
+    @app.cli.command('ensure-indexes')
+    def ensure_indexes_command():
+        """Create any missing MongoDB indexes."""
+        created, failed = ensure_indexes(mongo.db)
+        for name in created:
+            click.echo(f"created {name}")
+        for name, error in failed.items():
+            click.echo(f"failed {name}: {error}", err=True)
+        if not created and not failed:
+            click.echo("all indexes present")
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.command('check-indexes')
+    @click.option('--explain', is_flag=True, help='Also explain each query shape against the live database.')
+    def check_indexes_command(explain):
+        """Fail if a route's query shape has no supporting index."""
+        problems = [(shape, "no declared index") for shape in unsupported_query_shapes()]
+        if explain:
+            problems += [(shape, "collection scan") for shape in explain_query_shapes(mongo.db)]
+        for (collection, equality, sort, route), reason in problems:
+            click.echo(f"{route}: {collection} filter={equality} sort={sort}: {reason}", err=True)
+        if problems:
+            raise SystemExit(1)
+        click.echo("every query shape has a supporting index")
+
+    @app.cli.command('migrate')
+    @click.option('--status', 'show_status', is_flag=True, help='List migrations and their progress without applying any.')
+    def migrate_command(show_status):
+        """Apply pending data migrations, resuming interrupted ones."""
+        if show_status:
+            for version, name, record in migration_status(mongo.db):
+                if record is None:
+                    state = "pending"
+                elif record.get('finishedAt'):
+                    state = f"done {record['finishedAt']:%Y-%m-%d %H:%M}"
+                else:
+                    state = f"interrupted after {record.get('processed', 0)} documents"
+                click.echo(f"{version:>3} {name}: {state}")
+            return
+        applied = run_migrations(mongo.db)
+        for name in applied:
+            click.echo(f"applied {name}")
+        if applied:
+            # Resolution states may have changed
+            location_status.rebuild()
+        else:
+            click.echo("database is up to date")
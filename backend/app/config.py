@@ -3,3 +3,75 @@ import os
 class Config:
     MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/periodpal")
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "super-secret-key")
+    # Create missing indexes when the app starts (also: `flask ensure-indexes`)
+    MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() == "true"
+    # Response cache: "simple" (in-process), "redis" (shared) or "none"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "simple")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv("CACHE_DEFAULT_TIMEOUT", "60"))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+    # Worker processes serving the app (gunicorn.conf.py sets it)
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+    # With several workers, the "simple" backend only sees its own worker's invalidations,
+    # so its entries live at most this long
+    CACHE_SIMPLE_MAX_TIMEOUT = int(os.getenv("CACHE_SIMPLE_MAX_TIMEOUT", "15"))
+    # Directory for the lock files that coalesce identical cache misses across workers; empty: per worker only
+    SINGLE_FLIGHT_LOCK_DIR = os.getenv("SINGLE_FLIGHT_LOCK_DIR", "")
+    SINGLE_FLIGHT_TIMEOUT_SECONDS = float(os.getenv("SINGLE_FLIGHT_TIMEOUT_SECONDS", "30"))
+    # Live events: use MongoDB change streams when the server supports them
+    EVENTS_CHANGE_STREAMS = os.getenv("EVENTS_CHANGE_STREAMS", "true").lower() == "true"
+    EVENTS_HISTORY = int(os.getenv("EVENTS_HISTORY", "1000"))
+    EVENTS_HEARTBEAT_SECONDS = int(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+    # Connections each process keeps open to MongoDB
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+    # Longest any operation waits to find a reachable server
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    # Time budget for the queries of one read endpoint (status, heatmap, reports, discussions)
+    MONGO_READ_BUDGET_MS = int(os.getenv("MONGO_READ_BUDGET_MS", "2000"))
+    # Consecutive connection errors or timeouts that stop those endpoints querying MongoDB, and for how long
+    MONGO_BREAKER_THRESHOLD = int(os.getenv("MONGO_BREAKER_THRESHOLD", "5"))
+    MONGO_BREAKER_COOLDOWN_SECONDS = float(os.getenv("MONGO_BREAKER_COOLDOWN_SECONDS", "10"))
+    # Last good responses served (marked stale) while MongoDB is unavailable
+    STALE_SNAPSHOT_SECONDS = int(os.getenv("STALE_SNAPSHOT_SECONDS", "86400"))
+    STALE_SNAPSHOT_MAX_ENTRIES = int(os.getenv("STALE_SNAPSHOT_MAX_ENTRIES", "256"))
+    STALE_SNAPSHOT_MAX_BYTES = int(os.getenv("STALE_SNAPSHOT_MAX_BYTES", str(2 * 1024 * 1024)))
+    # Longest a view waits on queries run through async_mongo
+    MONGO_ASYNC_TIMEOUT_SECONDS = float(os.getenv("MONGO_ASYNC_TIMEOUT_SECONDS", "30"))
+    # "queue" makes POST /api/reports answer 202 and store reports in the background
+    INGEST_MODE = os.getenv("INGEST_MODE", "direct")
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "200"))
+    INGEST_FLUSH_INTERVAL_MS = int(os.getenv("INGEST_FLUSH_INTERVAL_MS", "50"))
+    # Directory for the crash journal of queued reports; empty keeps them in memory only
+    INGEST_JOURNAL_DIR = os.getenv("INGEST_JOURNAL_DIR", "")
+    INGEST_DRAIN_SECONDS = float(os.getenv("INGEST_DRAIN_SECONDS", "10"))
+    # Request and MongoDB command metrics at /metrics, served with "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    # Serve /metrics without a token (only behind a proxy that keeps it internal)
+    METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() == "true"
+    # Also count the BSON size of every MongoDB reply (re-encodes each reply, so off by default)
+    METRICS_MONGO_REPLY_BYTES = os.getenv("METRICS_MONGO_REPLY_BYTES", "false").lower() == "true"
+    # Log finds and aggregates slower than this (ms) with their plan; 0 disables
+    SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "0"))
+    SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+    SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "200"))
+    # Rotating JSON-lines file for slow queries; empty keeps them in memory only
+    SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE", "")
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+    # Profile requests sent with "X-Profile: cpu,memory" and "X-Profile-Token: <token>"; needs both set
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+    PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+    PROFILING_KEEP = int(os.getenv("PROFILING_KEEP", "50"))
+    # Reports of one location and issue type within this window become one incident; 0 disables
+    CLUSTER_WINDOW_MINUTES = int(os.getenv("CLUSTER_WINDOW_MINUTES", "60"))
+    # Hours of hourly report counts each process keeps for /api/heatmap/cube
+    HEATMAP_CUBE_DAYS = int(os.getenv("HEATMAP_CUBE_DAYS", "30"))
+    HEATMAP_CUBE_REFRESH_SECONDS = float(os.getenv("HEATMAP_CUBE_REFRESH_SECONDS", "5"))
+    # Longest a worker serves facilities from memory without checking for changes
+    FACILITY_CACHE_SECONDS = float(os.getenv("FACILITY_CACHE_SECONDS", "60"))
+    # How often a worker asks the cache whether facilities were changed elsewhere
+    FACILITY_VERSION_CHECK_SECONDS = float(os.getenv("FACILITY_VERSION_CHECK_SECONDS", "5"))
@@ -0,0 +1,176 @@
+"""
+Live events for the dashboards, delivered over server-sent events.
+
+`EventBroker` keeps the last EVENTS_HISTORY events of this process in memory
+with increasing ids, so a reconnecting client can resume from its
+Last-Event-ID. Ids are "<worker tag>-<sequence>": the tag is random per
+process, so an id from another worker (or from before a restart) is
+recognised and answered with "resync" instead of resuming at an unrelated
+position. Events come from one of two sources:
+
+- MongoDB change streams (needs a replica set), watched by a background
+  thread started with the first subscriber. Every worker then sees writes
+  made by any worker.
+- Otherwise the routes publish their own writes in-process, and a
+  subscriber only hears of writes handled by its own worker. Use a replica
+  set when running several workers.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from itertools import islice
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ["reports", "location_status"]
+
+
+class EventBroker:
+
+    def __init__(self, history=1000):
+        self._events = deque(maxlen=history)
+        self._last_id = 0
+        self._cond = threading.Condition()
+        self._watcher = None
+        self.change_streams = True
+        self.heartbeat = 15
+        # "local" until a change stream is actually open
+        self.source = "local"
+        self._tag = None
+        self._tag_pid = None
+
+    def init_app(self, app):
+        self._events = deque(maxlen=app.config.get('EVENTS_HISTORY', 1000))
+        self.change_streams = app.config.get('EVENTS_CHANGE_STREAMS', True)
+        self.heartbeat = app.config.get('EVENTS_HEARTBEAT_SECONDS', 15)
+
+    def publish(self, event_type, data):
+        """Publish an event caused by a write in this process."""
+        # With change streams the watcher sees the write and publishes it
+        if self.source == "change_stream":
+            return
+        self._append(event_type, data)
+
+    def _append(self, event_type, data):
+        with self._cond:
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, data))
+            self._cond.notify_all()
+
+    @property
+    def tag(self):
+        """This process's event id prefix. Forked workers share the broker object, so it is made per pid."""
+        if self._tag_pid != os.getpid():
+            self._tag, self._tag_pid = uuid.uuid4().hex[:8], os.getpid()
+        return self._tag
+
+    def _event_id(self, position):
+        return f"{self.tag}-{position}"
+
+    def _start_position(self, last_event_id):
+        """
+        Position to stream from, and whether the client missed events (it is
+        older than the history kept, or the id is from another worker or from
+        before a restart).
+        """
+        if not last_event_id:
+            return self._last_id, False
+        tag, _, sequence = last_event_id.partition("-")
+        try:
+            position = int(sequence)
+        except ValueError:
+            return self._last_id, True
+        if tag != self.tag:
+            return self._last_id, True
+        oldest = self._events[0][0] if self._events else self._last_id + 1
+        if position > self._last_id or position < oldest - 1:
+            return self._last_id, True
+        return position, False
+
+    def listen(self, last_event_id=None):
+        """
+        Yield (id, type, data) for every event after `last_event_id`, blocking
+        for new ones. Yields None every `heartbeat` seconds without events.
+        """
+        with self._cond:
+            position, missed = self._start_position(last_event_id)
+
+        while True:
+            if missed:
+                # Tell the client to refetch instead of replaying partial history
+                missed = False
+                yield (self._event_id(position), "resync", {})
+            with self._cond:
+                if self._last_id == position:
+                    self._cond.wait(self.heartbeat)
+                oldest = self._events[0][0] if self._events else self._last_id + 1
+                if position + 1 < oldest:
+                    # Fell behind the history kept while streaming: events are gone
+                    position, missed = self._last_id, True
+                    continue
+                pending = list(islice(self._events, position + 1 - oldest, None))
+            if not pending:
+                yield None
+                continue
+            for position, event_type, data in pending:
+                yield (self._event_id(position), event_type, data)
+
+    def ensure_watcher(self, db):
+        """Start the change stream watcher thread for this process, once."""
+        if not self.change_streams or self._watcher is not None:
+            return
+        with self._cond:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, args=(db,), name="event-watcher", daemon=True)
+                self._watcher.start()
+
+    def _watch(self, db):
+        pipeline = [{"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}}]
+        resume_token = None
+        while True:
+            try:
+                with db.watch(pipeline, full_document='updateLookup', resume_after=resume_token) as stream:
+                    self.source = "change_stream"
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self._dispatch(change)
+            except OperationFailure as e:
+                if resume_token is None:
+                    # Standalone server: change streams are not supported
+                    logger.info("Change streams unavailable, publishing events in-process: %s", e)
+                    self.source = "local"
+                    return
+                resume_token = None
+                time.sleep(1)
+            except PyMongoError as e:
+                logger.warning("Change stream interrupted, resuming: %s", e)
+                time.sleep(1)
+
+    def _dispatch(self, change):
+        from app import location_status, report_status
+
+        collection = change['ns']['coll']
+        operation = change['operationType']
+        document = change.get('fullDocument')
+
+        if collection == "reports" and operation == "insert":
+            self._append("report-created", report_status.public_report(document))
+        elif collection == "reports" and operation == "delete":
+            self._append("report-deleted", {"reportId": change['documentKey']['_id']})
+        elif collection == "reports" and operation == "update":
+            updated = change['updateDescription']['updatedFields']
+            status = updated.get('status')
+            if status == report_status.RESOLVED_BY_ADMIN and document is not None:
+                self._append("report-resolved", report_status.admin_update(document))
+            elif status == report_status.CONFIRMED:
+                self._append("resolution-confirmed", {"reportId": change['documentKey']['_id']})
+            elif 'reportCount' in updated:
+                # A report merged into the incident (see report_store)
+                priority = document.get('priority') if document is not None else None
+                self._append("report-merged", {"reportId": change['documentKey']['_id'], "priority": priority})
+        elif collection == "location_status" and document is not None:
+            self._append("location-status-changed", location_status.describe_document(document))
@@ -1,5 +1,25 @@
 from flask_pymongo import PyMongo
 from flask_jwt_extended import JWTManager
+from app.cache import ResponseCache
+from app.events import EventBroker
+from app.mongo_pool import PoolMonitor
+from app.metrics import Metrics
+from app.slow_queries import SlowQueryLog
+from app.profiling import Profiler
+from app.async_db import AsyncMongo
+from app.ingest import IngestQueue
+from app.heatmap_cube import HeatmapCube
+from app.resilience import Resilience
 
 mongo = PyMongo()
 jwt = JWTManager()
+cache = ResponseCache()
+events = EventBroker()
+pool_monitor = PoolMonitor()
+metrics = Metrics()
+slow_queries = SlowQueryLog()
+profiler = Profiler()
+async_mongo = AsyncMongo()
+ingest = IngestQueue()
+heatmap_cube = HeatmapCube()
+resilience = Resilience()
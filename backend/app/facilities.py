@@ -0,0 +1,141 @@
+"""
+Facility registry: every washroom, with a small stable integer id.
+
+    {"_id": <int>, "name": "Restroom - Second Floor(210)", "building",
+     "floor": <int>, "room": "210", "audit": {...}}
+
+`name` is the location string reports have always carried; reports also
+store the facility's id as `facilityId`. Ids come from the `counters`
+collection and are never reused.
+
+Every process keeps the whole registry in memory (`registry`). It is
+reloaded when the "facilities" cache namespace is invalidated and at least
+every FACILITY_CACHE_SECONDS, so workers that do not share a cache
+backend pick up changes too. The namespace version (a Redis round trip on
+a shared backend) is read at most every FACILITY_VERSION_CHECK_SECONDS.
+"""
+import re
+import threading
+import time
+from pymongo import ReturnDocument
+from app.extensions import mongo, cache
+
+DEFAULT_BUILDING = "Main"
+DEFAULT_LOCATIONS = [
+    "Restroom - Ground Floor(010)",
+    "Restroom - First Floor(110)",
+    "Restroom - Second Floor(210)",
+    "Restroom - Third Floor(310)",
+    "Restroom - Fourth Floor(410)",
+    "Restroom - Fifth Floor(510)",
+    "Restroom - Sixth Floor(610)",
+]
+
+# The first digit of a room number is its floor: "(210)" is room 210 on floor 2
+_ROOM_NUMBER = re.compile(r"\(((\d)\d\d)\)")
+
+
+def parse_location(location):
+    """(floor, room) from the room number in a location name, or (None, None)."""
+    match = _ROOM_NUMBER.search(location or '')
+    return (int(match.group(2)), match.group(1)) if match else (None, None)
+
+
+def next_id(db):
+    counter = db.counters.find_one_and_update(
+        {"_id": "facilities"}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return counter['seq']
+
+
+def create(db, name, building=DEFAULT_BUILDING, floor=None, room=None):
+    """Insert a facility and return it. Raises DuplicateKeyError for a taken name or room."""
+    parsed_floor, parsed_room = parse_location(name)
+    floor = parsed_floor if floor is None else floor
+    room = parsed_room if room is None else room
+    facility = {"_id": next_id(db), "name": name, "building": building, "floor": floor, "room": room}
+    db.facilities.insert_one(facility)
+    return facility
+
+
+def ensure_for_locations(db, locations):
+    """Register every location name that is not a facility yet. Returns {name: id} for all of them."""
+    known = {doc['name']: doc['_id'] for doc in db.facilities.find({"name": {"$in": list(locations)}}, {"name": 1})}
+    for location in locations:
+        if location not in known:
+            known[location] = create(db, location)['_id']
+    return known
+
+
+def public(facility):
+    """The facility as GET /api/facilities returns it (the shape Audit.jsx expects)."""
+    audit = facility.get('audit') or {}
+    return {
+        "id": facility['_id'],
+        "name": facility['name'],
+        "building": facility.get('building'),
+        "floor": facility.get('floor'),
+        "room": facility.get('room'),
+        "status": audit.get('status', "Not audited"),
+        "overallScore": audit.get('overallScore', 0),
+        "lastAudit": audit.get('lastAudit', "Never"),
+        "scores": {
+            "hygiene": 0, "supplies": 0, "privacy": 0, "accessibility": 0,
+            **(audit.get('scores') or {}),
+        },
+    }
+
+
+class FacilityRegistry:
+
+    def __init__(self):
+        self.timeout = 60
+        self.check_interval = 5
+        self._lock = threading.Lock()
+        # (by id, by name), swapped as one so readers never see a mix
+        self._tables = ({}, {})
+        self._loaded = None
+        self._version = None
+        self._checked = None
+
+    def init_app(self, app):
+        self.timeout = app.config.get('FACILITY_CACHE_SECONDS', 60)
+        self.check_interval = app.config.get('FACILITY_VERSION_CHECK_SECONDS', 5)
+        self._loaded = None
+
+    def _current(self):
+        now = time.monotonic()
+        fresh = self._loaded is not None and now - self._loaded < self.timeout
+        if fresh and now - self._checked < self.check_interval:
+            return self._tables
+        version = cache.versions(['facilities'])[0]
+        self._checked = now
+        if fresh and version == self._version:
+            return self._tables
+        with self._lock:
+            facilities = list(mongo.db.facilities.find().sort("_id", 1))
+            self._tables = (
+                {facility['_id']: facility for facility in facilities},
+                {facility['name']: facility for facility in facilities},
+            )
+            self._loaded = self._checked = time.monotonic()
+            self._version = version
+        return self._tables
+
+    def all(self):
+        """Every facility, in id order."""
+        return list(self._current()[0].values())
+
+    def get(self, facility_id):
+        return self._current()[0].get(facility_id)
+
+    def by_name(self, name):
+        return self._current()[1].get(name)
+
+    def invalidate(self):
+        """After a facility was created or changed."""
+        cache.invalidate('facilities')
+        self._loaded = None
+
+
+registry = FacilityRegistry()
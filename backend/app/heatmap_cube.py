@@ -0,0 +1,230 @@
+"""
+In-memory report cube for slicing the heatmap interactively.
+
+Each process keeps the hourly report counts of the last HEATMAP_CUBE_DAYS
+days in one NumPy array indexed [location, category, priority, hour],
+loaded from the hourly `report_rollups`. Queries slice it by time, floor,
+location, category and priority, and roll it up to any two of location,
+building, floor, category and priority, without touching MongoDB.
+Buildings and floors come from the facility registry.
+
+The cube refreshes itself at most every HEATMAP_CUBE_REFRESH_SECONDS: it
+re-reads only the rollups updated since the last refresh (rollups hold
+totals, so applying one twice is harmless) and slides its hour window
+forward as time passes.
+
+Needs `numpy` (listed in requirements.txt); `available` is False without it.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from app.pagination import EPOCH
+
+try:
+    import numpy as np
+except ImportError:  # only needed for /api/heatmap/cube
+    np = None
+
+HOUR = timedelta(hours=1)
+# Rollups written by other workers may carry a slightly different clock
+REFRESH_OVERLAP = timedelta(minutes=1)
+# Axis of the counts array each dimension is read from
+AXES = {"location": 0, "building": 0, "floor": 0, "category": 1, "priority": 2}
+COLOR_BINS = 5
+
+
+def _facility_field(field):
+    """Function giving `field` of the facility a location name belongs to, or None."""
+    from app.facilities import parse_location, registry
+
+    def lookup(location):
+        facility = registry.by_name(location)
+        if facility is not None:
+            return facility.get(field)
+        # Not registered: the floor can still be read from the room number
+        return parse_location(location)[0] if field == "floor" else None
+    return lookup
+
+
+def _hour(when):
+    return (when - EPOCH) // HOUR
+
+
+class HeatmapCube:
+
+    def __init__(self):
+        self.days = 30
+        self.refresh_seconds = 5
+        self._lock = threading.Lock()
+        self._reset()
+
+    @property
+    def available(self):
+        return np is not None
+
+    def init_app(self, app):
+        self.days = app.config.get('HEATMAP_CUBE_DAYS', 30)
+        self.refresh_seconds = app.config.get('HEATMAP_CUBE_REFRESH_SECONDS', 5)
+        self._reset()
+
+    def _reset(self):
+        self._labels = {"location": [], "category": [], "priority": []}
+        self._positions = {"location": {}, "category": {}, "priority": {}}
+        self._counts = None
+        self._first_hour = None
+        self._watermark = None
+        self._checked = None
+
+    # ---------------------------
+    # Loading
+    # ---------------------------
+    def _position(self, dimension, label):
+        """Position of `label` on its axis, growing the array for a new label."""
+        positions = self._positions[dimension]
+        if label not in positions:
+            positions[label] = len(positions)
+            self._labels[dimension].append(label)
+            axis = AXES[dimension]
+            if self._counts.shape[axis] < len(positions):
+                padding = [(0, 0)] * self._counts.ndim
+                padding[axis] = (0, max(4, self._counts.shape[axis]))
+                self._counts = np.pad(self._counts, padding)
+        return positions[label]
+
+    def _slide(self, current_hour):
+        """Move the window so it ends with `current_hour`, dropping older hours."""
+        hours = self.days * 24
+        first_hour = current_hour - hours + 1
+        if self._counts is None:
+            self._counts = np.zeros((8, 8, 4, hours), dtype=np.int32)
+        elif first_hour > self._first_hour:
+            shift = min(first_hour - self._first_hour, hours)
+            self._counts[..., :hours - shift] = self._counts[..., shift:]
+            self._counts[..., hours - shift:] = 0
+        self._first_hour = first_hour
+
+    def _apply(self, rollup):
+        column = _hour(rollup['bucket']) - self._first_hour
+        if not 0 <= column < self.days * 24:
+            return
+        location = self._position("location", rollup['location'])
+        category = self._position("category", rollup['issueType'])
+        priority = self._position("priority", rollup['priority'])
+        self._counts[location, category, priority, column] = rollup.get('reported', 0)
+
+    def refresh(self, force=False):
+        """Bring the cube up to date if it was last refreshed more than refresh_seconds ago."""
+        from app.extensions import mongo
+
+        if not force and self._checked is not None and time.monotonic() - self._checked < self.refresh_seconds:
+            return
+        with self._lock:
+            if not force and self._checked is not None and time.monotonic() - self._checked < self.refresh_seconds:
+                return
+            started = datetime.utcnow()
+            self._slide(_hour(started))
+            query = {"granularity": "hour", "bucket": {"$gte": EPOCH + self._first_hour * HOUR}}
+            if self._watermark is not None:
+                query["updatedAt"] = {"$gte": self._watermark - REFRESH_OVERLAP}
+            projection = {"_id": 0, "bucket": 1, "location": 1, "issueType": 1, "priority": 1, "reported": 1}
+            for rollup in mongo.db.report_rollups.find(query, projection):
+                self._apply(rollup)
+            self._watermark = started
+            self._checked = time.monotonic()
+
+    # ---------------------------
+    # Querying
+    # ---------------------------
+    def _mask(self, dimension, values):
+        labels = self._labels[dimension]
+        mask = np.ones(self._counts.shape[AXES[dimension]], dtype=bool)
+        mask[len(labels):] = False
+        if values is not None:
+            mask[:len(labels)] &= np.array([label in values for label in labels], dtype=bool)
+        return mask
+
+    def _grouping(self, dimension, grouped, mask):
+        """
+        (labels, matrix mapping axis positions to groups) for one axis; only
+        the positions selected by `mask` are counted.
+        """
+        size = self._counts.shape[AXES[dimension]]
+        if not grouped:
+            return [None], mask[:, None].astype(np.int64)
+        if dimension in ("building", "floor"):
+            labels, key = self._labels["location"], _facility_field(dimension)
+        else:
+            labels, key = self._labels[dimension], lambda label: label
+        keys = {position: key(label) for position, label in enumerate(labels) if mask[position]}
+        groups = sorted(set(keys.values()), key=lambda key: (key is None, key))
+        matrix = np.zeros((size, len(groups)), dtype=np.int64)
+        for position, key in keys.items():
+            matrix[position, groups.index(key)] = 1
+        return groups, matrix
+
+    def query(self, start=None, end=None, locations=None, buildings=None, floors=None, categories=None,
+              priorities=None, rows="location", columns="category"):
+        """
+        Report counts made in [start, end) (default: the whole window) for
+        the selected values of each dimension (None selects all), summed
+        into a `rows` x `columns` matrix.
+        """
+        if AXES[rows] == AXES[columns]:
+            raise ValueError(f"{rows} and {columns} cannot be combined")
+        self.refresh()
+        with self._lock:
+            first = 0 if start is None else max(0, _hour(start) - self._first_hour)
+            last = self.days * 24 if end is None else min(self.days * 24, _hour(end) - self._first_hour)
+            window = self._counts[..., first:max(first, last)].sum(axis=3)
+
+            location_mask = self._mask("location", locations)
+            for field, selected in (("building", buildings), ("floor", floors)):
+                if selected is not None:
+                    key = _facility_field(field)
+                    location_mask[:len(self._labels["location"])] &= np.array(
+                        [key(label) in selected for label in self._labels["location"]], dtype=bool
+                    )
+            masks = [location_mask, self._mask("category", categories), self._mask("priority", priorities)]
+
+            # Filtering and rolling up are one product with a 0/1 matrix per axis
+            groupings = {}
+            for dimension in AXES:
+                axis = AXES[dimension]
+                if dimension in (rows, columns) or axis not in (AXES[rows], AXES[columns]):
+                    groupings[axis] = self._grouping(dimension, dimension in (rows, columns), masks[axis])
+            cube = np.einsum('lcp,la,cb,pd->abd', window, *(groupings[axis][1] for axis in range(3)))
+
+        other = ({0, 1, 2} - {AXES[rows], AXES[columns]}).pop()
+        matrix = cube.sum(axis=other)
+        if AXES[rows] > AXES[columns]:
+            matrix = matrix.T
+        return self._describe(groupings[AXES[rows]][0], groupings[AXES[columns]][0], matrix)
+
+    def _describe(self, row_labels, column_labels, matrix):
+        """Response body for a matrix: totals, maxima and color bins precomputed."""
+        nonzero = matrix[matrix > 0]
+        if nonzero.size:
+            # Upper bounds of bins 1..COLOR_BINS-1, by quantile of the non-empty cells
+            thresholds = np.unique(np.quantile(nonzero, np.linspace(0, 1, COLOR_BINS + 1)[1:-1]))
+        else:
+            thresholds = np.array([], dtype=np.int64)
+        bins = np.where(matrix > 0, np.searchsorted(thresholds, matrix, side='left') + 1, 0)
+        return {
+            "rows": row_labels,
+            "columns": column_labels,
+            "matrix": matrix.tolist(),
+            "bins": bins.tolist(),
+            "thresholds": thresholds.tolist(),
+            "rowTotals": matrix.sum(axis=1).tolist(),
+            "columnTotals": matrix.sum(axis=0).tolist(),
+            "rowMax": matrix.max(axis=1, initial=0).tolist(),
+            "columnMax": matrix.max(axis=0, initial=0).tolist(),
+            "max": int(matrix.max(initial=0)),
+            "total": int(matrix.sum()),
+        }
+
+    def window(self):
+        """(start, end) of the hours the cube holds."""
+        self.refresh()
+        start = EPOCH + self._first_hour * HOUR
+        return start, start + self.days * 24 * HOUR
@@ -0,0 +1,163 @@
+"""
+Index declarations for every query shape the routes issue.
+
+`INDEXES` lists the indexes each collection needs and `QUERY_SHAPES` lists
+the queries the routes actually run. `ensure_indexes` creates whatever is
+missing (it is safe to run repeatedly) and `unsupported_query_shapes`
+reports any declared query that no index can serve, so adding a query
+without its index is caught by `flask check-indexes`.
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+INDEXES = {
+    "reports": [
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("reporterEmails", ASCENDING), ("timestamp", DESCENDING)], name="reporterEmails_timestamp"),
+        IndexModel([("status", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="status_timestamp_id"),
+        IndexModel([("location", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="location_timestamp_id"),
+        IndexModel([("priority", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="priority_timestamp_id"),
+        IndexModel([("status", ASCENDING), ("resolvedAt", DESCENDING)], name="status_resolvedAt"),
+        IndexModel([("facilityId", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="facilityId_timestamp_id"),
+        # Only reports submitted with a key take part in the uniqueness check
+        IndexModel(
+            [("idempotencyKeys", ASCENDING)], name="idempotencyKeys", unique=True,
+            partialFilterExpression={"idempotencyKeys": {"$type": "string"}}
+        ),
+        # One open incident per cluster; resolved reports drop their key
+        IndexModel(
+            [("clusterKey", ASCENDING)], name="clusterKey", unique=True,
+            partialFilterExpression={"clusterKey": {"$type": "string"}}
+        ),
+    ],
+    "report_rollups": [
+        # The upserts and $merge of app.rollups match on the whole key
+        IndexModel(
+            [("granularity", ASCENDING), ("bucket", ASCENDING), ("location", ASCENDING),
+             ("issueType", ASCENDING), ("priority", ASCENDING)],
+            name="granularity_bucket_dimensions", unique=True
+        ),
+        IndexModel([("granularity", ASCENDING), ("updatedAt", ASCENDING)], name="granularity_updatedAt"),
+    ],
+    "facilities": [
+        IndexModel([("name", ASCENDING)], name="name", unique=True),
+        # Facilities without a room number are exempt
+        IndexModel(
+            [("building", ASCENDING), ("floor", ASCENDING), ("room", ASCENDING)], name="building_floor_room",
+            unique=True, partialFilterExpression={"room": {"$type": "string"}}
+        ),
+    ],
+    "discussions": [
+        IndexModel([("createdAt", DESCENDING)], name="createdAt"),
+        IndexModel([("tags", ASCENDING), ("createdAt", DESCENDING)], name="tags_createdAt"),
+    ],
+    "comments": [
+        IndexModel([("discussionId", ASCENDING), ("createdAt", ASCENDING), ("_id", ASCENDING)], name="discussionId_createdAt_id"),
+    ],
+    "location_status": [
+        IndexModel([("openReports.reportId", ASCENDING)], name="openReports_reportId"),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email", unique=True),
+    ],
+    "admins": [
+        IndexModel([("email", ASCENDING)], name="email", unique=True),
+    ],
+}
+
+# (collection, equality fields, sort, issued by)
+QUERY_SHAPES = [
+    ("reports", [], [("timestamp", -1), ("_id", -1)], "reports.get_all_reports"),
+    ("reports", ["status"], [("timestamp", -1), ("_id", -1)], "reports.get_all_reports"),
+    ("reports", ["location"], [("timestamp", -1), ("_id", -1)], "reports.get_all_reports"),
+    ("reports", ["priority"], [("timestamp", -1), ("_id", -1)], "reports.get_all_reports"),
+    ("reports", ["facilityId"], [("timestamp", -1), ("_id", -1)], "reports.get_all_reports"),
+    ("reports", ["location"], [], "migrations.register_facilities"),
+    ("reports", ["reporterEmails"], [("timestamp", -1)], "reports.get_my_reports"),
+    ("reports", ["reporterEmails"], [("timestamp", -1)], "dashboard.my_reports"),
+    ("reports", ["_id"], [], "report_status.advance"),
+    ("reports", ["status"], [("resolvedAt", -1)], "report_status.admin_updates_pipeline"),
+    ("reports", ["status"], [], "analytics.get_heatmap_data"),
+    ("reports", ["idempotencyKeys"], [], "report_store.insert_reports"),
+    ("reports", ["clusterKey"], [], "report_store.insert_reports"),
+    ("location_status", ["openReports.reportId"], [], "location_status.report_escalated"),
+    ("report_rollups", ["granularity"], [("bucket", 1)], "analytics.get_trends"),
+    ("report_rollups", ["granularity", "bucket", "location", "issueType", "priority"], [], "rollups.reports_created"),
+    ("report_rollups", ["granularity"], [("updatedAt", 1)], "heatmap_cube.refresh"),
+    ("facilities", ["name"], [], "facilities.ensure_for_locations"),
+    ("discussions", [], [("createdAt", -1)], "discussions.get_all_discussions"),
+    ("discussions", ["tags"], [("createdAt", -1)], "discussions.get_all_discussions"),
+    ("discussions", ["_id"], [], "discussions.get_discussion"),
+    ("comments", ["discussionId"], [("createdAt", 1), ("_id", 1)], "discussions.get_comments"),
+    ("location_status", ["openReports.reportId"], [], "location_status.report_closed"),
+    ("users", ["email"], [], "auth.login"),
+    ("admins", ["email"], [], "auth.login"),
+]
+
+
+def _index_keys(collection):
+    keys = [[("_id", 1)]]
+    for model in INDEXES.get(collection, []):
+        keys.append(list(model.document["key"].items()))
+    return keys
+
+
+def _supports(keys, equality, sort):
+    """True if an index with `keys` can serve equality on `equality` plus `sort`."""
+    if len(keys) < len(equality) + len(sort):
+        return False
+    if {field for field, _ in keys[:len(equality)]} != set(equality):
+        return False
+    rest = keys[len(equality):len(equality) + len(sort)]
+    if [field for field, _ in rest] != [field for field, _ in sort]:
+        return False
+    # An index can be walked in either direction, but only as a whole
+    forward = all(direction == wanted for (_, direction), (_, wanted) in zip(rest, sort))
+    backward = all(direction == -wanted for (_, direction), (_, wanted) in zip(rest, sort))
+    return forward or backward
+
+
+def unsupported_query_shapes():
+    """Query shapes from QUERY_SHAPES that none of the declared indexes serve."""
+    return [
+        shape for shape in QUERY_SHAPES
+        if not any(_supports(keys, shape[1], shape[2]) for keys in _index_keys(shape[0]))
+    ]
+
+
+def ensure_indexes(db):
+    """
+    Create missing indexes. Returns (created, failed) where `created` lists
+    "collection.index" names that did not exist before and `failed` maps
+    names to the error that prevented their creation.
+    """
+    created, failed = [], {}
+    for collection, models in INDEXES.items():
+        existing = db[collection].index_information()
+        for model in models:
+            name = model.document["name"]
+            if name in existing:
+                continue
+            try:
+                db[collection].create_indexes([model])
+                created.append(f"{collection}.{name}")
+            except OperationFailure as e:
+                failed[f"{collection}.{name}"] = str(e)
+    return created, failed
+
+
+def explain_query_shapes(db):
+    """
+    Run each declared query shape through explain() and return the ones
+    whose winning plan still contains a collection scan.
+    """
+    scans = []
+    for shape in QUERY_SHAPES:
+        collection, equality, sort, _ = shape
+        cursor = db[collection].find({field: "" for field in equality})
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in str(plan):
+            scans.append(shape)
+    return scans
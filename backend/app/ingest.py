@@ -0,0 +1,245 @@
+"""
+Write-behind ingestion of submitted reports (INGEST_MODE=queue).
+
+`submit` puts a validated report on a bounded in-process queue and returns
+a tracking id at once; a background thread drains the queue into MongoDB
+in batches through `report_store.insert_reports`. The tracking id doubles
+as the report's idempotency key, so a report written twice (a retried
+batch, or a journal replayed after a crash) is only stored once, and
+`GET /api/reports/ingest/<tracking id>` can find it from any worker.
+
+- Backpressure: when the queue is full `submit` raises `QueueFull` and the
+  route answers 503 with Retry-After.
+- Durability: with INGEST_JOURNAL_DIR set, every queued report is also
+  appended (and fsynced) to a per-process journal file, which is truncated
+  whenever the queue is empty. When its flusher starts, a process replays
+  the journals of processes that are gone. At exit the queue is drained
+  for up to INGEST_DRAIN_SECONDS.
+- Batches that fail for any reason other than a database error (which is
+  retried), and reports the database rejects, are moved to
+  `deadletter-<pid>.jsonl` in the journal directory for inspection and
+  replay; without a journal directory they are logged in full. Replayed
+  journals are dead-lettered the same way before they are removed.
+"""
+import atexit
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from bson import json_util
+from pymongo.errors import PyMongoError
+
+try:
+    import fcntl
+except ImportError:  # Windows: no forking server, every journal found is an orphan
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+QueueFull = queue.Full
+
+
+class IngestQueue:
+
+    def __init__(self):
+        self.enabled = False
+        self.batch_size = 200
+        self.flush_interval = 0.05
+        self.drain_seconds = 10
+        self.journal_dir = None
+        self._queue = queue.Queue(maxsize=10000)
+        self._lock = threading.Lock()
+        self._journal = None
+        self._pending = set()
+        self._keep_journal = False
+        self._pid = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('INGEST_MODE', 'direct') == 'queue'
+        self.batch_size = app.config.get('INGEST_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('INGEST_FLUSH_INTERVAL_MS', 50) / 1000
+        self.drain_seconds = app.config.get('INGEST_DRAIN_SECONDS', 10)
+        self.journal_dir = app.config.get('INGEST_JOURNAL_DIR') or None
+        self._queue = queue.Queue(maxsize=app.config.get('INGEST_QUEUE_SIZE', 10000))
+
+    # ---------------------------
+    # Submitting
+    # ---------------------------
+    def submit(self, report):
+        """
+        Queue `report` for insertion and return its tracking id. Raises
+        QueueFull when the queue is at capacity.
+        """
+        self._ensure_started()
+        report.setdefault('idempotencyKeys', [uuid.uuid4().hex])
+        tracking_id = report['idempotencyKeys'][0]
+        with self._lock:
+            # Count the batch being written too, so a stalled database
+            # cannot let more than INGEST_QUEUE_SIZE reports pile up
+            if self._queue.unfinished_tasks >= self._queue.maxsize:
+                raise QueueFull
+            self._queue.put_nowait(report)
+            self._pending.add(tracking_id)
+            self._write_journal([report])
+        return tracking_id
+
+    def is_pending(self, tracking_id):
+        """True while the report is queued in this process."""
+        return tracking_id in self._pending
+
+    # ---------------------------
+    # Journal
+    # ---------------------------
+    def _journal_path(self, pid):
+        return os.path.join(self.journal_dir, f"ingest-{pid}.jsonl")
+
+    def _write_journal(self, reports):
+        if self._journal is None:
+            return
+        self._journal.write("".join(json_util.dumps(report) + "\n" for report in reports))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _open_journal(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._journal = open(self._journal_path(os.getpid()), "a", encoding="utf-8")
+        if fcntl is not None:
+            # Held for the life of the process; a lock that can be taken
+            # marks the journal of a process that is gone
+            fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _replay_orphaned_journals(self, report_store):
+        """
+        Store the reports left in the journals of processes that are gone.
+        A journal is removed only once its reports are stored or dead-lettered.
+        Its process may have stored some of them before it died, maybe before
+        their hooks ran, so the batches are inserted as retries.
+        """
+        own = self._journal_path(os.getpid())
+        for path in glob.glob(self._journal_path("*")):
+            if path == own:
+                continue
+            try:
+                with open(path, "r+", encoding="utf-8") as journal:
+                    if fcntl is not None:
+                        try:
+                            fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except OSError:
+                            continue  # Its process is alive
+                    reports = [json_util.loads(line) for line in journal if line.strip()]
+                    for start in range(0, len(reports), self.batch_size):
+                        batch = reports[start:start + self.batch_size]
+                        results = report_store.insert_reports(batch, retry=True)
+                        failed = [report for report, result in zip(batch, results) if result['status'] == "error"]
+                        if failed and not self._dead_letter(failed):
+                            raise OSError("could not dead-letter rejected reports")
+                os.remove(path)
+                logger.info("Replayed %d queued reports from %s", len(reports), path)
+            except (OSError, ValueError, PyMongoError) as e:
+                logger.warning("Could not replay %s, keeping it for the next start: %s", path, e)
+
+    def _truncate_journal_if_idle(self):
+        with self._lock:
+            if self._journal is not None and self._queue.unfinished_tasks == 0 and not self._keep_journal:
+                self._journal.truncate(0)
+
+    def _dead_letter(self, batch):
+        """Set aside reports that cannot be stored. False if that failed too."""
+        if self.journal_dir is None:
+            logger.error("Unstored queued reports: %s", json_util.dumps(batch))
+            return True
+        path = os.path.join(self.journal_dir, f"deadletter-{os.getpid()}.jsonl")
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("".join(json_util.dumps(report) + "\n" for report in batch))
+                f.flush()
+                os.fsync(f.fileno())
+            logger.error("Moved %d queued reports that cannot be stored to %s", len(batch), path)
+            return True
+        except OSError as e:
+            logger.error("Could not write %s: %s", path, e)
+            return False
+
+    # ---------------------------
+    # Flushing
+    # ---------------------------
+    def start(self):
+        """Start the flusher (and replay orphaned journals) before the first submission."""
+        if self.enabled:
+            self._ensure_started()
+
+    def _ensure_started(self):
+        # Threads and file locks do not survive a fork: every worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self.journal_dir:
+                self._open_journal()
+            threading.Thread(target=self._run, name="ingest-flusher", daemon=True).start()
+            atexit.register(self.drain)
+            self._pid = os.getpid()
+
+    def _next_batch(self):
+        """Block for one report, then collect more for up to flush_interval."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        from app import report_store
+
+        if self.journal_dir:
+            self._replay_orphaned_journals(report_store)
+        while True:
+            batch = self._next_batch()
+            delay = 0.5
+            retry = False
+            unstored = None
+            while True:
+                try:
+                    results = report_store.insert_reports(batch, retry=retry)
+                    failed = [(report, r) for report, r in zip(batch, results) if r['status'] == "error"]
+                    if failed:
+                        logger.error("%d queued reports were rejected: %s", len(failed), failed[0][1]['error'])
+                        unstored = [report for report, _ in failed]
+                    break
+                except PyMongoError as e:
+                    # Keep the batch: the queue fills up and submitters get 503s
+                    logger.warning("Storing %d queued reports failed, retrying in %.1fs: %s", len(batch), delay, e)
+                    time.sleep(delay)
+                    delay = min(delay * 2, 30)
+                    # Part of it may be stored already
+                    retry = True
+                except Exception:
+                    logger.exception("Storing %d queued reports failed", len(batch))
+                    unstored = batch
+                    break
+            if unstored and not self._dead_letter(unstored):
+                # The journal still holds them: stop truncating it so they survive a restart
+                self._keep_journal = True
+            for report in batch:
+                self._pending.discard(report['idempotencyKeys'][0])
+                self._queue.task_done()
+            self._truncate_journal_if_idle()
+
+    def drain(self, timeout=None):
+        """Wait until every queued report is stored, for at most `timeout` seconds."""
+        deadline = time.monotonic() + (self.drain_seconds if timeout is None else timeout)
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if self._queue.unfinished_tasks:
+            logger.warning("%d queued reports not stored at shutdown", self._queue.unfinished_tasks)
+        return self._queue.unfinished_tasks == 0
@@ -0,0 +1,82 @@
+"""
+JSON encoding for MongoDB documents.
+
+`MongoJSONProvider` is installed as `app.json`, so `jsonify` can be handed
+documents straight from pymongo: ObjectIds become strings and datetimes ISO
+8601 strings. When orjson is installed it is used for encoding; otherwise
+the standard library encoder is used with the same output.
+"""
+from datetime import date, datetime
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from bson import ObjectId
+from bson.datetime_ms import DatetimeMS
+from bson.decimal128 import Decimal128
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+STREAM_BATCH_SIZE = 200
+
+
+def _default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, DatetimeMS):
+        return o.as_datetime().isoformat()
+    if isinstance(o, Decimal128):
+        return str(o)
+    return DefaultJSONProvider.default(o)
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        # orjson has no equivalent for most json.dumps options
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def json_list_response(items, transform=None):
+    """
+    Stream `items` (typically a pymongo cursor) as a JSON array without
+    building the whole list in memory. `transform` is applied to each item.
+    """
+    items = iter(items)
+    dumps = current_app.json.dumps
+
+    def encode(item):
+        return dumps(transform(item) if transform else item)
+
+    # Fetch the first batch here so query errors surface before streaming
+    try:
+        first = next(items)
+    except StopIteration:
+        return current_app.response_class("[]\n", mimetype="application/json")
+
+    def generate():
+        chunk = ["[", encode(first)]
+        for item in items:
+            chunk.append(",")
+            chunk.append(encode(item))
+            if len(chunk) >= STREAM_BATCH_SIZE:
+                yield "".join(chunk)
+                chunk = []
+        chunk.append("]\n")
+        yield "".join(chunk)
+
+    return current_app.response_class(generate(), mimetype="application/json")
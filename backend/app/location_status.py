@@ -0,0 +1,203 @@
+"""
+Per-location washroom status, maintained incrementally.
+
+Every location has one document in the `location_status` collection holding
+the reports that are still open there:
+
+    {"_id": "<location>", "openReports": [{"reportId", "high", "timestamp"}]}
+
+Report writes push/pull entries with single-document updates, so reading the
+status of every washroom is one scan over a few dozen small documents instead
+of a pass over the whole reports collection.
+"""
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from app.extensions import mongo, async_mongo
+from app.report_status import PENDING
+
+HIGH_PRIORITIES = ['HIGH', 'HIGH PRIORITY']
+
+
+def is_high_priority(priority):
+    return str(priority or '').upper() in HIGH_PRIORITIES
+
+
+def _open_entry(report):
+    return {
+        "reportId": report['_id'],
+        "high": is_high_priority(report.get('priority')),
+        "timestamp": report.get('timestamp'),
+    }
+
+
+def report_opened(report):
+    """
+    Record a newly submitted report (must already have an `_id`). Returns
+    the updated location_status document.
+    """
+    if not report.get('location'):
+        return None
+    # $addToSet keeps this idempotent if it races with rebuild()
+    return mongo.db.location_status.find_one_and_update(
+        {"_id": report['location']},
+        {"$addToSet": {"openReports": _open_entry(report)}, "$set": {"updatedAt": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def reports_opened(reports):
+    """
+    report_opened for many reports with one update per location. Returns
+    the updated location_status documents.
+    """
+    by_location = {}
+    for report in reports:
+        if report.get('location'):
+            by_location.setdefault(report['location'], []).append(_open_entry(report))
+    return [
+        mongo.db.location_status.find_one_and_update(
+            {"_id": location},
+            {"$addToSet": {"openReports": {"$each": entries}}, "$set": {"updatedAt": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        for location, entries in by_location.items()
+    ]
+
+
+def report_escalated(report_id):
+    """
+    Mark an open report high priority after a high priority report was
+    merged into it. Returns the updated location_status document, or None.
+    """
+    return mongo.db.location_status.find_one_and_update(
+        {"openReports.reportId": report_id},
+        {"$set": {"openReports.$.high": True, "updatedAt": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def report_closed(report_id):
+    """
+    Remove a resolved, confirmed or deleted report from its location.
+    Returns the updated location_status document, or None if the report
+    was not open.
+    """
+    return mongo.db.location_status.find_one_and_update(
+        {"openReports.reportId": report_id},
+        {"$pull": {"openReports": {"reportId": report_id}}, "$set": {"updatedAt": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def status_row(doc, since):
+    """
+    Summarise a location_status document: the number of open reports filed
+    since `since`, how many of those are high priority and the latest one.
+    """
+    active = [
+        entry for entry in doc.get('openReports', [])
+        if entry.get('timestamp') is None or entry['timestamp'] >= since
+    ]
+    timestamps = [entry['timestamp'] for entry in active if entry.get('timestamp') is not None]
+    return {
+        "_id": doc['_id'],
+        "activeCount": len(active),
+        "highPriorityCount": sum(1 for entry in active if entry.get('high')),
+        "latest": max(timestamps) if timestamps else None,
+    }
+
+
+def read_status(since):
+    """
+    status_row for every location. Existing databases get location_status
+    from the `location_status` migration.
+    """
+    return [status_row(doc, since) for doc in mongo.db.location_status.find()]
+
+
+async def read_status_async(since):
+    """read_status on async_mongo."""
+    return [status_row(doc, since) for doc in await async_mongo.db.location_status.find().to_list()]
+
+
+def time_ago(report_time, now):
+    """Human readable distance between `report_time` and `now`."""
+    time_diff = now - report_time
+    if time_diff.total_seconds() < 3600:  # Less than 1 hour
+        minutes = int(time_diff.total_seconds() / 60)
+        return f"{minutes} mins ago" if minutes > 0 else "Just now"
+    elif time_diff.total_seconds() < 86400:  # Less than 24 hours
+        hours = int(time_diff.total_seconds() / 3600)
+        return f"{hours} hour{'s' if hours > 1 else ''} ago"
+    days = int(time_diff.total_seconds() / 86400)
+    return f"{days} day{'s' if days > 1 else ''} ago"
+
+
+def describe(row, now):
+    """
+    Washroom status entry for a status_row:
+    - 'good': No issues in last 24 hours
+    - 'maintenance': Has issues but not critical
+    - 'issue': Has active critical issues
+    """
+    if not row["activeCount"]:
+        status = "good"
+        last_updated = "No recent issues"
+    else:
+        status = "issue" if row["highPriorityCount"] > 0 else "maintenance"
+        # Only undated reports are active: treat them as "just now"
+        last_updated = time_ago(row.get("latest") or now, now)
+
+    return {
+        "name": row["_id"],
+        "status": status,
+        "lastUpdated": last_updated,
+        "activeCount": row["activeCount"],
+        "highPriorityCount": row["highPriorityCount"],
+    }
+
+
+def describe_document(doc):
+    """Current washroom status entry for a single location_status document."""
+    now = datetime.utcnow()
+    return describe(status_row(doc, now - timedelta(days=1)), now)
+
+
+def rebuild_pipeline():
+    """Aggregation over `reports` that recreates every location_status document."""
+    return [
+        {"$match": {"location": {"$nin": [None, ""]}}},
+        {"$project": {"location": 1, "priority": 1, "timestamp": 1, "status": 1}},
+        {
+            "$group": {
+                "_id": "$location",
+                "reports": {
+                    "$push": {
+                        "open": {"$eq": ["$status", PENDING]},
+                        "reportId": "$_id",
+                        "high": {"$in": [{"$toUpper": {"$ifNull": ["$priority", ""]}}, HIGH_PRIORITIES]},
+                        "timestamp": "$timestamp",
+                    }
+                },
+            }
+        },
+        {
+            "$project": {
+                "openReports": {
+                    "$map": {
+                        "input": {"$filter": {"input": "$reports", "cond": "$$this.open"}},
+                        "in": {"reportId": "$$this.reportId", "high": "$$this.high", "timestamp": "$$this.timestamp"},
+                    }
+                },
+                "updatedAt": "$$NOW",
+            }
+        },
+        {"$merge": {"into": "location_status", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+def rebuild(db=None):
+    """Recompute location_status from the reports collection (of `db`, default the app's)."""
+    (mongo.db if db is None else db).reports.aggregate(rebuild_pipeline())
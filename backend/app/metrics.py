@@ -0,0 +1,275 @@
+"""
+Request and MongoDB command metrics in the Prometheus text format.
+
+`Metrics` times every request (by route template, method and status) from
+Flask request hooks, and every MongoDB command (by collection and command
+name) as a pymongo CommandListener on both clients. `GET /metrics` renders
+them.
+
+Recording takes no lock: each thread writes to its own shard of plain
+counters (a list per label set, created the first time the label set is
+seen), and a scrape sums the shards. When a thread ends its shard is
+folded into a shared base and dropped, so short-lived threads do not pile
+up shards. Counters are per worker process and
+start at zero again when a worker is recycled, which Prometheus treats as
+a counter reset. Every series carries a `worker` label (the process id),
+so series of different workers are not mistaken for one counter; sum them
+over `worker` in queries.
+"""
+import os
+import threading
+import weakref
+from bisect import bisect_left
+from time import perf_counter
+import bson
+from flask import g, request
+from pymongo import monitoring
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# A series is a list: one count per bucket, the +Inf count, the sum of
+# observed seconds, then request or command counters
+_SUM = len(BUCKETS) + 1
+# Requests: response bytes
+_BYTES = _SUM + 1
+_REQUEST_SLOTS = _BYTES + 1
+# Commands: failures, documents returned, reply bytes
+_FAILURES = _SUM + 1
+_DOCUMENTS = _SUM + 2
+_REPLY_BYTES = _SUM + 3
+_COMMAND_SLOTS = _REPLY_BYTES + 1
+
+# Started commands a thread remembers while waiting for their replies
+MAX_PENDING = 1000
+
+
+class _Shard:
+    """One thread's counters. Only that thread writes to it."""
+
+    __slots__ = ("generation", "requests", "commands", "pending")
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.requests = {}
+        self.commands = {}
+        # (connection, request id) -> collection of commands awaiting a reply
+        self.pending = {}
+
+
+class _Owner:
+    """Held only by a thread's locals: it is freed, and its shard retired, when the thread ends."""
+
+    __slots__ = ("shard", "__weakref__")
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+def _add(totals, counters):
+    for key, series in list(counters.items()):
+        total = totals.get(key)
+        if total is None:
+            totals[key] = list(series)
+        else:
+            for i, value in enumerate(series):
+                total[i] += value
+
+
+def _observe(series, seconds):
+    series[bisect_left(BUCKETS, seconds)] += 1
+    series[_SUM] += seconds
+
+
+def _collection(command_name, command):
+    if command_name == "getMore":
+        return command.get("collection", "-")
+    target = command.get(command_name)
+    # Database commands (ping, aggregate: 1, ...) have no collection
+    return target if isinstance(target, str) else "-"
+
+
+def _documents(reply):
+    cursor = reply.get("cursor")
+    if not isinstance(cursor, dict):
+        return 0
+    return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metrics(monitoring.CommandListener):
+
+    def __init__(self):
+        self.enabled = True
+        self.reply_bytes = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        # Counters of threads that have ended
+        self._base = _Shard(0)
+        self._generation = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.reply_bytes = app.config.get('METRICS_MONGO_REPLY_BYTES', False)
+        if not self.enabled:
+            return
+        app.before_request(self._request_started)
+        app.after_request(self._request_finished)
+
+    def reset(self):
+        """Drop every counter, e.g. in a freshly forked worker."""
+        with self._lock:
+            self._generation += 1
+            self._shards = []
+            self._base = _Shard(self._generation)
+
+    def _shard(self):
+        owner = getattr(self._local, "owner", None)
+        if owner is None or owner.shard.generation != self._generation:
+            with self._lock:
+                owner = _Owner(_Shard(self._generation))
+                self._shards.append(owner.shard)
+            weakref.finalize(owner, self._retire, owner.shard)
+            self._local.owner = owner
+        return owner.shard
+
+    def _retire(self, shard):
+        """Fold the counters of a thread that ended into the base."""
+        with self._lock:
+            if shard not in self._shards:
+                return
+            self._shards.remove(shard)
+            if shard.generation == self._generation:
+                _add(self._base.requests, shard.requests)
+                _add(self._base.commands, shard.commands)
+
+    # ---------------------------
+    # Requests
+    # ---------------------------
+    def _request_started(self):
+        g.metrics_started = perf_counter()
+
+    def _request_finished(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        key = (route, request.method, response.status_code)
+        requests = self._shard().requests
+        series = requests.get(key)
+        if series is None:
+            series = requests[key] = [0] * _REQUEST_SLOTS
+        _observe(series, perf_counter() - started)
+        if response.is_streamed:
+            # No length up front: counted as the body is sent, on this thread
+            response.response = self._count_bytes(response.response, series)
+        else:
+            series[_BYTES] += response.content_length or 0
+        return response
+
+    @staticmethod
+    def _count_bytes(body, series):
+        for chunk in body:
+            series[_BYTES] += len(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+
+    # ---------------------------
+    # MongoDB commands
+    # ---------------------------
+    def started(self, event):
+        pending = self._shard().pending
+        if len(pending) >= MAX_PENDING:
+            pending.clear()
+        pending[(event.connection_id, event.request_id)] = _collection(event.command_name, event.command)
+
+    def _command_series(self, event):
+        shard = self._shard()
+        collection = shard.pending.pop((event.connection_id, event.request_id), "-")
+        key = (collection, event.command_name)
+        series = shard.commands.get(key)
+        if series is None:
+            series = shard.commands[key] = [0] * _COMMAND_SLOTS
+        _observe(series, event.duration_micros / 1e6)
+        return series
+
+    def succeeded(self, event):
+        series = self._command_series(event)
+        series[_DOCUMENTS] += _documents(event.reply)
+        if self.reply_bytes:
+            series[_REPLY_BYTES] += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        self._command_series(event)[_FAILURES] += 1
+
+    # ---------------------------
+    # Exposition
+    # ---------------------------
+    def _totals(self, attribute):
+        totals = {}
+        with self._lock:
+            # Items are copied first: the owning thread may add label sets meanwhile
+            for shard in [self._base, *self._shards]:
+                _add(totals, getattr(shard, attribute))
+        return sorted(totals.items())
+
+    def _histogram(self, lines, name, help_text, label_names, rows):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for values, series in rows:
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(label_names, values, le)} {cumulative}")
+            labels = _labels(label_names, values)
+            lines.append(f"{name}_sum{labels} {series[_SUM]:.6f}")
+            lines.append(f"{name}_count{labels} {cumulative}")
+
+    def _counter(self, lines, name, help_text, label_names, rows, slot):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for values, series in rows:
+            lines.append(f"{name}{_labels(label_names, values)} {series[slot]}")
+
+    def render(self, gauges=()):
+        """Every metric in the Prometheus text format. `gauges` adds (name, help, value) gauges."""
+        lines = []
+        worker = (str(os.getpid()),)
+        requests = [(worker + key, series) for key, series in self._totals("requests")]
+        request_labels = ("worker", "route", "method", "status")
+        self._histogram(lines, "http_request_duration_seconds", "Time to produce a response.", request_labels, requests)
+        self._counter(
+            lines, "http_response_bytes_total", "Response body bytes sent.",
+            request_labels, requests, _BYTES
+        )
+
+        commands = [(worker + key, series) for key, series in self._totals("commands")]
+        command_labels = ("worker", "collection", "command")
+        self._histogram(lines, "mongodb_command_duration_seconds", "MongoDB command round trips.", command_labels, commands)
+        self._counter(lines, "mongodb_command_failures_total", "MongoDB commands that failed.", command_labels, commands, _FAILURES)
+        self._counter(
+            lines, "mongodb_documents_returned_total", "Documents returned in cursor batches.",
+            command_labels, commands, _DOCUMENTS
+        )
+        if self.reply_bytes:
+            self._counter(
+                lines, "mongodb_reply_bytes_total", "BSON size of command replies.",
+                command_labels, commands, _REPLY_BYTES
+            )
+
+        for name, help_text, value in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{_labels(('worker',), worker)} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,321 @@
+"""
+Versioned data migrations.
+
+`MIGRATIONS` lists every migration in the order it must run. Progress is
+recorded in the `schema_migrations` collection, one document per version:
+
+    {"_id": <version>, "name", "startedAt", "finishedAt", "processed",
+     "checkpoint": {"<collection or pass>": <last _id done>}}
+
+`run_migrations` applies the versions that have not finished. Migrations
+walk collections in `_id` order through `MigrationRun.batches`, which
+saves a checkpoint after every batch, so an interrupted run resumes where
+it stopped. Every batch is also idempotent, so reprocessing the batch that
+was in flight is harmless.
+"""
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.indexes import INDEXES
+from app.report_status import PENDING, RESOLVED_BY_ADMIN, create_admin_updates_view
+from app.schemas import apply_validators
+from app import facilities, location_status, rollups
+
+DUPLICATE_KEY = 11000
+BATCH_SIZE = 500
+
+
+class MigrationRun:
+    """Progress of one migration version, as stored in schema_migrations."""
+
+    def __init__(self, db, record, batch_size=BATCH_SIZE):
+        self.db = db
+        self.record = record
+        self.batch_size = batch_size
+
+    def batches(self, collection, query, projection=None, checkpoint_key=None):
+        """
+        Yield lists of documents of `collection` matching `query` in _id
+        order, starting after the saved checkpoint. The checkpoint moves
+        past a batch once the caller asks for the next one. Passes over the
+        same collection need distinct `checkpoint_key`s (default: the
+        collection name).
+        """
+        checkpoint_key = checkpoint_key or collection
+        checkpoint = self.record.get('checkpoint', {}).get(checkpoint_key)
+        while True:
+            batch_query = dict(query)
+            if checkpoint is not None:
+                batch_query['_id'] = {"$gt": checkpoint}
+            batch = list(
+                self.db[collection].find(batch_query, projection)
+                .sort("_id", 1)
+                .limit(self.batch_size)
+            )
+            if not batch:
+                return
+            yield batch
+            checkpoint = batch[-1]['_id']
+            self.db.schema_migrations.update_one(
+                {"_id": self.record['_id']},
+                {"$set": {f"checkpoint.{checkpoint_key}": checkpoint}, "$inc": {"processed": len(batch)}}
+            )
+
+
+def _insert_ignoring_duplicates(collection, documents):
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        if any(error['code'] != DUPLICATE_KEY for error in e.details['writeErrors']):
+            raise
+
+
+def _object_id(value):
+    """`value` as an ObjectId when it is one or a valid hex string, else None."""
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value if isinstance(value, ObjectId) else None
+
+
+def _canonical_date(field):
+    """
+    Aggregation expression turning a legacy `field` value (ISO string or
+    {"$date": ms} document) into a BSON date. Missing or unparseable values
+    fall back to the document's creation time, taken from its ObjectId.
+    """
+    value = f"${field}"
+    created = {"$toDate": "$_id"}
+    return {
+        "$switch": {
+            "branches": [
+                {
+                    "case": {"$eq": [{"$type": value}, "date"]},
+                    "then": value,
+                },
+                {
+                    "case": {"$eq": [{"$type": value}, "string"]},
+                    "then": {"$dateFromString": {"dateString": value, "onError": created}},
+                },
+                {
+                    "case": {"$eq": [{"$type": value}, "object"]},
+                    "then": {
+                        "$convert": {
+                            "input": {"$getField": {"field": {"$literal": "$date"}, "input": value}},
+                            "to": "date",
+                            "onError": created,
+                            "onNull": created,
+                        }
+                    },
+                },
+            ],
+            "default": created,
+        }
+    }
+
+
+# ---------------------------
+# Migrations
+# ---------------------------
+def migrate_embedded_comments(run):
+    """
+    Move comments embedded in `discussions.comments` into the `comments`
+    collection and set `commentCount` on every discussion.
+    """
+    db = run.db
+    for batch in run.batches("discussions", {"comments.0": {"$exists": True}}, {"comments": 1}):
+        for discussion in batch:
+            comments = []
+            for comment in discussion['comments']:
+                # Embedded comments carry a str(ObjectId()) id; keeping it
+                # makes re-running after a partial failure a no-op
+                comments.append({
+                    "_id": _object_id(comment.get('_id')) or ObjectId(),
+                    "discussionId": discussion['_id'],
+                    "text": comment.get('text', ''),
+                    "authorEmail": comment.get('authorEmail', 'anonymous'),
+                    "createdAt": comment.get('createdAt'),
+                })
+            _insert_ignoring_duplicates(db.comments, comments)
+            db.discussions.update_one(
+                {"_id": discussion['_id']},
+                {
+                    "$set": {"commentCount": db.comments.count_documents({"discussionId": discussion['_id']})},
+                    "$unset": {"comments": ""},
+                }
+            )
+
+    # Discussions that never had comments
+    db.discussions.update_many(
+        {"commentCount": {"$exists": False}},
+        {"$set": {"commentCount": 0}, "$unset": {"comments": ""}}
+    )
+
+
+def migrate_admin_updates(run):
+    """
+    Record the resolutions stored in the `admin_updates` collection on their
+    reports (status resolved_by_admin, resolvedAt), then replace the
+    collection with the view derived from reports. admin_updates.reportId
+    was stored both as ObjectId and as string; both are matched.
+    """
+    db = run.db
+    existing = next(db.list_collections(filter={"name": "admin_updates"}), None)
+    if existing is not None and existing.get("type") == "view":
+        return
+
+    # Reports written before statuses were kept everywhere
+    db.reports.update_many({"status": {"$exists": False}}, {"$set": {"status": PENDING}})
+
+    for batch in run.batches("admin_updates", {}, {"reportId": 1, "timestamp": 1}):
+        requests = [
+            UpdateOne(
+                {"_id": _object_id(update.get('reportId')), "status": PENDING},
+                {"$set": {"status": RESOLVED_BY_ADMIN, "resolvedAt": update.get('timestamp')}}
+            )
+            for update in batch if _object_id(update.get('reportId'))
+        ]
+        if requests:
+            db.reports.bulk_write(requests, ordered=False)
+
+    db.admin_updates.drop()
+    create_admin_updates_view(db)
+
+
+def canonicalize_dates(run):
+    """
+    Rewrite dates stored as ISO strings or {"$date": ms} documents, or
+    missing altogether, as BSON dates.
+    """
+    fields = [
+        ("reports", "timestamp"),
+        ("reports", "resolvedAt"),
+        ("discussions", "createdAt"),
+        ("comments", "createdAt"),
+    ]
+    for collection, field in fields:
+        legacy = {field: {"$not": {"$type": "date"}}}
+        if field == "resolvedAt":
+            # Only resolved reports have one
+            legacy["status"] = {"$ne": PENDING}
+        for batch in run.batches(collection, legacy, {"_id": 1}, checkpoint_key=f"{collection}_{field}"):
+            run.db[collection].update_many(
+                {"_id": {"$in": [doc['_id'] for doc in batch]}},
+                [{"$set": {field: _canonical_date(field)}}]
+            )
+
+
+def install_validators(run):
+    """Add the $jsonSchema validators from app.schemas."""
+    apply_validators(run.db)
+
+
+def report_incidents(run):
+    """
+    Move the single `idempotencyKey` of reports into the `idempotencyKeys`
+    list incidents keep, give every report a `reportCount`, drop the old
+    unique index and install the matching validator.
+    """
+    db = run.db
+    legacy = {"idempotencyKey": {"$exists": True}}
+    for batch in run.batches("reports", legacy, {"_id": 1}):
+        db.reports.update_many(
+            {"_id": {"$in": [doc['_id'] for doc in batch]}},
+            [{"$set": {"idempotencyKeys": ["$idempotencyKey"]}}, {"$unset": "idempotencyKey"}]
+        )
+    db.reports.update_many({"reportCount": {"$exists": False}}, {"$set": {"reportCount": 1}})
+    if "idempotencyKey" in db.reports.index_information():
+        db.reports.drop_index("idempotencyKey")
+    apply_validators(db)
+
+
+def backfill_rollups(run):
+    """Fill report_rollups from the existing reports. Needs MongoDB 5.0 or later ($dateTrunc)."""
+    run.db.report_rollups.create_indexes(INDEXES["report_rollups"])
+    rollups.rebuild(run.db)
+
+
+def register_facilities(run):
+    """
+    Register the default locations and every location reports name as
+    facilities, and set `facilityId` on the reports.
+    """
+    db = run.db
+    for collection in ("facilities", "reports"):
+        db[collection].create_indexes(INDEXES[collection])
+    apply_validators(db)
+    locations = facilities.DEFAULT_LOCATIONS + sorted(
+        location for location in db.reports.distinct("location")
+        if isinstance(location, str) and location and location not in facilities.DEFAULT_LOCATIONS
+    )
+    for location, facility_id in facilities.ensure_for_locations(db, locations).items():
+        db.reports.update_many(
+            {"location": location, "facilityId": {"$exists": False}},
+            {"$set": {"facilityId": facility_id}}
+        )
+
+
+def report_reporters(run):
+    """
+    Start `reporterEmails` on every report from its `userEmail`, index it in
+    place of `userEmail` and install the matching validator.
+    """
+    db = run.db
+    legacy = {"reporterEmails": {"$exists": False}, "userEmail": {"$type": "string"}}
+    for batch in run.batches("reports", legacy, {"_id": 1}):
+        db.reports.update_many(
+            {"_id": {"$in": [doc['_id'] for doc in batch]}},
+            [{"$set": {"reporterEmails": ["$userEmail"]}}]
+        )
+    db.reports.create_indexes(INDEXES["reports"])
+    if "userEmail_timestamp" in db.reports.index_information():
+        db.reports.drop_index("userEmail_timestamp")
+    apply_validators(db)
+
+
+def build_location_status(run):
+    """Build location_status from the reports stored before it was maintained."""
+    run.db.location_status.create_indexes(INDEXES["location_status"])
+    location_status.rebuild(run.db)
+
+
+# (version, name, migration) in the order they are applied
+MIGRATIONS = [
+    (1, "embedded_comments", migrate_embedded_comments),
+    (2, "admin_updates_view", migrate_admin_updates),
+    (3, "canonical_dates", canonicalize_dates),
+    (4, "schema_validators", install_validators),
+    (5, "report_idempotency_key_validator", install_validators),
+    (6, "report_incidents", report_incidents),
+    (7, "report_rollups", backfill_rollups),
+    (8, "facilities", register_facilities),
+    (9, "report_reporters", report_reporters),
+    (10, "location_status", build_location_status),
+]
+
+
+def migration_status(db):
+    """(version, name, record or None) for every known migration."""
+    records = {record['_id']: record for record in db.schema_migrations.find()}
+    return [(version, name, records.get(version)) for version, name, _ in MIGRATIONS]
+
+
+def run_migrations(db, batch_size=BATCH_SIZE):
+    """
+    Apply every migration that has not finished, in order, resuming any
+    that was interrupted. Returns the names of the migrations applied.
+    """
+    applied = []
+    for version, name, migration in MIGRATIONS:
+        record = db.schema_migrations.find_one_and_update(
+            {"_id": version},
+            {"$setOnInsert": {"name": name, "startedAt": datetime.utcnow(), "processed": 0, "checkpoint": {}}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if record.get('finishedAt'):
+            continue
+        migration(MigrationRun(db, record, batch_size))
+        db.schema_migrations.update_one({"_id": version}, {"$set": {"finishedAt": datetime.utcnow()}})
+        applied.append(name)
+    return applied
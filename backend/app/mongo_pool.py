@@ -0,0 +1,55 @@
+"""
+Connection pool bookkeeping for the readiness check.
+
+pymongo does not expose how many pooled connections are open, so
+`PoolMonitor` counts them from connection pool events.
+"""
+import threading
+from pymongo import monitoring
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready_connections = 0
+
+    def reset(self):
+        with self._lock:
+            self.ready_connections = 0
+
+    def connection_ready(self, event):
+        with self._lock:
+            self.ready_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.ready_connections = max(self.ready_connections - 1, 0)
+
+    # Events we do not need
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
@@ -0,0 +1,36 @@
+"""
+Keyset pagination helpers.
+
+A cursor is "<milliseconds since epoch>.<ObjectId>" for the (date, _id)
+position of the last document of a page; the next page starts strictly
+after it in the sort order.
+"""
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(value, _id):
+    """Cursor for the position (value, _id), or None if value is not a date."""
+    if not isinstance(value, datetime):
+        # Dates not yet canonicalized by `flask migrate` cannot be ranged over
+        return None
+    millis = (value - EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}.{_id}"
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError or InvalidId if malformed."""
+    millis, _, _id = cursor.partition('.')
+    return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(_id)
+
+
+def after_cursor(field, cursor, descending=True):
+    """Filter matching documents after `cursor` when sorted by (field, _id)."""
+    value, _id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, "_id": {op: _id}},
+    ]}
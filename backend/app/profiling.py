@@ -0,0 +1,180 @@
+"""
+On-demand profiling of single requests.
+
+With PROFILING_ENABLED and a PROFILING_TOKEN set, a request sent with
+
+    X-Profile: cpu,memory
+    X-Profile-Token: <PROFILING_TOKEN>
+
+is profiled from its first request hook until its response has been sent,
+including the body of streamed responses:
+
+- cpu: cProfile on the request's thread. Stored as `<id>.prof` (pstats, for
+  snakeviz or `python -m pstats`) and `<id>.txt` (top functions by
+  cumulative time).
+- memory: tracemalloc snapshots before and after, stored as `<id>.mem.txt`
+  (top allocation growth by line). tracemalloc sees every thread, so run
+  it on a quiet worker; one memory profile runs at a time per process.
+
+The response carries `X-Profile-Id`; artifacts are listed and downloaded
+from /api/admin/diagnostics/profiles. Only the newest PROFILING_KEEP runs
+are kept.
+"""
+import cProfile
+import glob
+import hmac
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("cpu", "memory")
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+TRACEMALLOC_FRAMES = 10
+# Artifact file suffixes, by the `format` the download endpoint accepts
+FORMATS = {"prof": ".prof", "txt": ".txt", "memory": ".mem.txt", "json": ".json"}
+
+
+class _Run:
+
+    def __init__(self, run_id, kinds):
+        self.id = run_id
+        self.kinds = kinds
+        self.started = time.perf_counter()
+        self.profiler = None
+        self.snapshot = None
+        self.started_tracing = False
+
+
+class Profiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.token = ""
+        self.directory = "profiles"
+        self.keep = 50
+        self._ids = itertools.count(1)
+        self._memory = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PROFILING_ENABLED', False)
+        self.token = app.config.get('PROFILING_TOKEN', '')
+        self.directory = os.path.abspath(app.config.get('PROFILING_DIR', 'profiles'))
+        self.keep = app.config.get('PROFILING_KEEP', 50)
+        if not (self.enabled and self.token):
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def path(self, run_id, fmt):
+        return os.path.join(self.directory, run_id + FORMATS[fmt])
+
+    def runs(self):
+        """Metadata of stored runs, newest first."""
+        runs = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as f:
+                    runs.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(runs, key=lambda run: run.get('at', ''), reverse=True)
+
+    # ---------------------------
+    # Request hooks
+    # ---------------------------
+    def _requested(self):
+        header = request.headers.get('X-Profile')
+        if not header:
+            return ()
+        if not hmac.compare_digest(request.headers.get('X-Profile-Token', ''), self.token):
+            return ()
+        return tuple(kind for kind in KINDS if kind in {part.strip().lower() for part in header.split(",")})
+
+    def _start(self):
+        kinds = self._requested()
+        if not kinds:
+            return
+        run = _Run(f"{datetime.utcnow():%Y%m%d-%H%M%S}-{os.getpid()}-{next(self._ids)}", kinds)
+        if "memory" in kinds:
+            if self._memory.acquire(blocking=False):
+                run.started_tracing = not tracemalloc.is_tracing()
+                if run.started_tracing:
+                    tracemalloc.start(TRACEMALLOC_FRAMES)
+                run.snapshot = tracemalloc.take_snapshot()
+            else:
+                logger.info("Skipping memory profile of %s: another one is running", request.path)
+        if "cpu" in kinds:
+            run.profiler = cProfile.Profile()
+            run.profiler.enable()
+        g.profile_run = run
+
+    def _finish(self, response):
+        run = g.get('profile_run')
+        if run is None:
+            return response
+        response.headers['X-Profile-Id'] = run.id
+        meta = {
+            "id": run.id,
+            "at": datetime.utcnow().isoformat() + "Z",
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "cpu": run.profiler is not None,
+            "memory": run.snapshot is not None,
+        }
+        # Streamed bodies are produced after this hook: stop once the response is sent
+        response.call_on_close(lambda: self._save(run, meta))
+        return response
+
+    # ---------------------------
+    # Artifacts
+    # ---------------------------
+    def _save(self, run, meta):
+        if run.profiler is not None:
+            run.profiler.disable()
+        meta["durationMs"] = round((time.perf_counter() - run.started) * 1000, 1)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if run.profiler is not None:
+                run.profiler.dump_stats(self.path(run.id, "prof"))
+                summary = io.StringIO()
+                pstats.Stats(run.profiler, stream=summary).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+                with open(self.path(run.id, "txt"), "w") as f:
+                    f.write(summary.getvalue())
+            if run.snapshot is not None:
+                growth = tracemalloc.take_snapshot().compare_to(run.snapshot, "lineno")
+                with open(self.path(run.id, "memory"), "w") as f:
+                    f.write(f"Top {TOP_ALLOCATIONS} allocation changes by line (all threads)\n\n")
+                    for stat in growth[:TOP_ALLOCATIONS]:
+                        f.write(f"{stat}\n")
+            with open(self.path(run.id, "json"), "w") as f:
+                json.dump(meta, f)
+            self._prune()
+        except OSError as e:
+            logger.warning("Could not store profile %s: %s", run.id, e)
+        finally:
+            if run.snapshot is not None:
+                run.snapshot = None
+                if run.started_tracing:
+                    tracemalloc.stop()
+                self._memory.release()
+
+    def _prune(self):
+        for meta in self.runs()[self.keep:]:
+            for fmt in FORMATS:
+                try:
+                    os.remove(self.path(meta['id'], fmt))
+                except (OSError, KeyError):
+                    pass
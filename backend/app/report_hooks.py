@@ -0,0 +1,67 @@
+"""
+Side effects shared by every route that changes a report: the
+location_status view, the report rollups, the response cache and live
+events.
+"""
+from app.extensions import cache, events
+from app import location_status, report_status, rollups
+
+
+def _location_changed(doc):
+    if doc is not None:
+        events.publish("location-status-changed", location_status.describe_document(doc))
+
+
+def report_created(report):
+    """After a report has been inserted (it must have its `_id`)."""
+    _location_changed(location_status.report_opened(report))
+    rollups.reports_created([report])
+    cache.invalidate('reports')
+    events.publish("report-created", report_status.public_report(report))
+
+
+def reports_created(reports):
+    """report_created for a batch of inserted reports, with one status update per location."""
+    for doc in location_status.reports_opened(reports):
+        _location_changed(doc)
+    rollups.reports_created(reports)
+    cache.invalidate('reports')
+    for report in reports:
+        events.publish("report-created", report_status.public_report(report))
+
+
+def reports_merged(merged):
+    """
+    After reports were merged into open incidents: `merged` holds
+    (incident id, merged report) pairs.
+    """
+    for incident_id, report in merged:
+        if location_status.is_high_priority(report.get('priority')):
+            _location_changed(location_status.report_escalated(incident_id))
+    rollups.reports_merged([report for _, report in merged])
+    cache.invalidate('reports')
+    for incident_id, report in merged:
+        events.publish("report-merged", {"reportId": incident_id, "priority": report.get('priority')})
+
+
+def report_resolved(report):
+    """After an admin moved `report` (the updated document) to resolved_by_admin."""
+    _location_changed(location_status.report_closed(report['_id']))
+    rollups.report_resolved(report)
+    cache.invalidate('reports')
+    events.publish("report-resolved", report_status.admin_update(report))
+
+
+def report_confirmed(report_id):
+    """After a report was confirmed resolved by its user."""
+    _location_changed(location_status.report_closed(report_id))
+    cache.invalidate('reports')
+    events.publish("resolution-confirmed", {"reportId": report_id})
+
+
+def report_deleted(report):
+    """After `report` (the document as it was) was deleted."""
+    _location_changed(location_status.report_closed(report['_id']))
+    rollups.report_deleted(report)
+    cache.invalidate('reports')
+    events.publish("report-deleted", {"reportId": report['_id']})
@@ -0,0 +1,95 @@
+"""
+Report resolution state, kept on the report document itself:
+
+    pending -> resolved_by_admin -> confirmed
+
+Each transition is a single find_one_and_update guarded by the current
+`status`, so concurrent admins or users cannot apply it twice. What used to
+be the `admin_updates` collection is derived from the reports waiting for
+user confirmation (see `admin_updates_pipeline`).
+"""
+from datetime import datetime
+from pymongo import ReturnDocument
+from app.extensions import mongo
+
+PENDING = "pending"
+RESOLVED_BY_ADMIN = "resolved_by_admin"
+CONFIRMED = "confirmed"
+
+# Statuses a report is listed with unless a status filter is given
+OPEN_STATUSES = [PENDING, RESOLVED_BY_ADMIN]
+
+# target status -> (status it must currently have, timestamp field to set)
+TRANSITIONS = {
+    RESOLVED_BY_ADMIN: (PENDING, "resolvedAt"),
+    CONFIRMED: (RESOLVED_BY_ADMIN, "confirmedAt"),
+}
+
+
+def advance(report_id, status):
+    """
+    Move report `report_id` to `status`. Returns (report, changed):
+
+    - (updated report, True) when the transition was applied
+    - (report, False) when the report is not in the state the transition
+      starts from; its current `status` tells whether it is already there
+    - (None, False) when there is no such report
+    """
+    required, timestamp_field = TRANSITIONS[status]
+    report = mongo.db.reports.find_one_and_update(
+        {"_id": report_id, "status": required},
+        # Once handled, an incident takes no more reports (see report_store)
+        {"$set": {"status": status, timestamp_field: datetime.utcnow()}, "$unset": {"clusterKey": ""}},
+        return_document=ReturnDocument.AFTER
+    )
+    if report is not None:
+        return report, True
+    # Only a failed transition pays for a second round trip
+    return mongo.db.reports.find_one({"_id": report_id}, {"status": 1}), False
+
+
+# Report fields anyone may see, e.g. on the public live event stream
+PUBLIC_FIELDS = ["issueType", "location", "priority", "details", "timestamp", "status", "reportCount", "facilityId"]
+
+
+# Projection leaving out who reported an incident, for report lists
+PRIVATE_PROJECTION = {"userEmail": 0, "reporterEmails": 0, "idempotencyKeys": 0}
+
+
+def public_report(report):
+    """`report` without its submitter and idempotency keys, as report-created events carry it."""
+    return {"_id": report['_id'], **{field: report.get(field) for field in PUBLIC_FIELDS if field in report}}
+
+
+def admin_update(report):
+    """The admin update entry for a resolved report, as admin_updates_pipeline builds it."""
+    return {
+        "_id": report['_id'],
+        "reportId": report['_id'],
+        "issueType": report.get('issueType', ''),
+        "location": report.get('location', ''),
+        "priority": report.get('priority', ''),
+        "timestamp": report.get('resolvedAt'),
+    }
+
+
+def admin_updates_pipeline():
+    """Aggregation over `reports` listing resolutions awaiting confirmation, newest first."""
+    return [
+        {"$match": {"status": RESOLVED_BY_ADMIN}},
+        {"$sort": {"resolvedAt": -1}},
+        {
+            "$project": {
+                "reportId": "$_id",
+                "issueType": {"$ifNull": ["$issueType", ""]},
+                "location": {"$ifNull": ["$location", ""]},
+                "priority": {"$ifNull": ["$priority", ""]},
+                "timestamp": "$resolvedAt",
+            }
+        },
+    ]
+
+
+def create_admin_updates_view(db):
+    """Create `admin_updates` as a read-only view over `reports`."""
+    db.create_collection("admin_updates", viewOn="reports", pipeline=admin_updates_pipeline())
@@ -0,0 +1,247 @@
+"""
+Building, validating and storing reports, shared by the single and bulk
+submission routes and the ingest queue.
+
+Idempotency: clients may send an `idempotencyKey` with a report. Reports
+keep the keys of every submission they hold in `idempotencyKeys`, under a
+unique index, so a retried submission is recognised as a duplicate instead
+of being stored (or counted) twice.
+
+Clustering: with CLUSTER_WINDOW_MINUTES set, reports of the same location
+and issue type in the same window share a `clusterKey`. The first one is
+stored as an incident and later ones are merged into it with an upsert on
+the (uniquely indexed) key: its `reportCount` goes up, the submitter joins
+its `reporterEmails`, and its priority is raised if a merged report is high
+priority. Resolving an incident removes
+its `clusterKey`, so the next report opens a new incident.
+"""
+from datetime import datetime, timezone
+from flask import current_app
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.extensions import mongo
+from app import facilities, report_hooks, report_status
+from app.location_status import is_high_priority
+from app.pagination import EPOCH
+
+REQUIRED_FIELDS = ['issueType', 'location', 'priority']
+TEXT_FIELDS = ['issueType', 'location', 'priority', 'details', 'idempotencyKey']
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+DUPLICATE_KEY = 11000
+
+
+def validate(data):
+    """Error message for a submitted report, or None if it is valid."""
+    if not isinstance(data, dict):
+        return "Report must be an object"
+    facility_id = data.get('facilityId')
+    if facility_id is not None:
+        if not isinstance(facility_id, int) or isinstance(facility_id, bool):
+            return "facilityId must be an integer"
+        if facilities.registry.get(facility_id) is None:
+            return f"Unknown facilityId {facility_id}"
+    for field in REQUIRED_FIELDS:
+        # A facilityId names the location
+        if not data.get(field) and not (field == 'location' and facility_id is not None):
+            return f"{field} is required"
+    for field in TEXT_FIELDS:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"{field} must be a string"
+    if len(data.get('idempotencyKey') or '') > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return f"idempotencyKey must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+    if data.get('timestamp') is not None and parse_timestamp(data['timestamp']) is None:
+        return "timestamp must be an ISO 8601 date"
+    return None
+
+
+def parse_timestamp(value):
+    """Naive UTC datetime for an ISO 8601 string, or None."""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def cluster_key(report, window_minutes):
+    """Key shared by the reports of one location and issue type in one window."""
+    window = int((report['timestamp'] - EPOCH).total_seconds() // (window_minutes * 60))
+    return f"{report['location']}|{report['issueType'].strip().lower()}|{window}"
+
+
+def build_report(data, email, now=None):
+    """
+    Report document for validated `data`. Offline clients may send the
+    `timestamp` the report was made at; it is capped at the current time.
+    The report references its facility, given as `facilityId` or found by
+    location name. Must be called with an app context (for
+    CLUSTER_WINDOW_MINUTES).
+    """
+    now = now or datetime.utcnow()
+    timestamp = min(parse_timestamp(data.get('timestamp')) or now, now)
+    if data.get('facilityId') is not None:
+        facility = facilities.registry.get(data['facilityId'])
+    else:
+        facility = facilities.registry.by_name(data['location'])
+    report = {
+        "issueType": data['issueType'],
+        "location": facility['name'] if facility else data['location'],
+        "priority": data['priority'],
+        "details": data.get('details') or '',
+        "timestamp": timestamp,
+        "lastReportedAt": timestamp,
+        "reportCount": 1,
+        "userEmail": email,
+        # Everyone whose report the incident holds; `userEmail` stays the first
+        "reporterEmails": [email],
+        "status": report_status.PENDING
+    }
+    if facility:
+        report['facilityId'] = facility['_id']
+    if data.get('idempotencyKey'):
+        report['idempotencyKeys'] = [data['idempotencyKey']]
+    window_minutes = current_app.config.get('CLUSTER_WINDOW_MINUTES', 0)
+    if window_minutes:
+        report['clusterKey'] = cluster_key(report, window_minutes)
+    return report
+
+
+def _write(report):
+    """Insert for a report without a clusterKey, upsert into its incident otherwise."""
+    if 'clusterKey' not in report:
+        return InsertOne(report)
+    on_insert = {
+        field: value for field, value in report.items()
+        if field not in ('clusterKey', 'reportCount', 'lastReportedAt', 'idempotencyKeys', 'reporterEmails')
+    }
+    update = {
+        "$setOnInsert": on_insert,
+        "$inc": {"reportCount": 1},
+        "$max": {"lastReportedAt": report['timestamp']},
+        "$addToSet": {"reporterEmails": {"$each": report['reporterEmails']}},
+    }
+    if report.get('idempotencyKeys'):
+        update["$addToSet"]["idempotencyKeys"] = {"$each": report['idempotencyKeys']}
+    if is_high_priority(report['priority']):
+        # Escalate the incident; the field cannot be in $setOnInsert as well
+        update["$set"] = {"priority": on_insert.pop('priority')}
+    return UpdateOne({"clusterKey": report['clusterKey']}, update, upsert=True)
+
+
+def _existing_ids(keys):
+    """Map idempotency keys to the ids of the reports already holding them."""
+    stored = mongo.db.reports.find({"idempotencyKeys": {"$in": list(keys)}}, {"idempotencyKeys": 1})
+    return {key: report['_id'] for report in stored for key in report['idempotencyKeys'] if key in keys}
+
+
+def insert_reports(reports, retry=False):
+    """
+    Store many reports with one unordered bulk write. Returns a result per
+    report, in order: {"status": "created" | "merged" | "duplicate" |
+    "error", "id"} plus "error" for failures; merged reports get the id of
+    their incident.
+
+    Pass `retry` when these same reports went through a call that failed
+    part way: reports found already stored were stored by that call, so
+    they count as created or merged and their hooks run now.
+    """
+    if not reports:
+        return []
+    # A key repeated within the batch is written once; later items are duplicates of the first
+    keys, repeats = {}, {}
+    for index, report in enumerate(reports):
+        if report.get('idempotencyKeys'):
+            key = report['idempotencyKeys'][0]
+            if key in keys:
+                repeats[index] = keys[key]
+            else:
+                keys[key] = index
+    existing = _existing_ids(set(keys)) if keys else {}
+    results = [None] * len(reports)
+    for key, index in keys.items():
+        if key in existing:
+            results[index] = {"status": "duplicate", "id": existing[key]}
+
+    positions = [index for index in range(len(reports)) if results[index] is None and index not in repeats]
+    errors, upserted = {}, {}
+    if positions:
+        try:
+            result = mongo.db.reports.bulk_write([_write(reports[index]) for index in positions], ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            errors = {error['index']: error for error in e.details['writeErrors']}
+            upserted = {item['index']: item['_id'] for item in e.details['upserted']}
+
+    created, merged, raced = [], [], {}
+    for position, index in enumerate(positions):
+        report = reports[index]
+        if position in errors:
+            if errors[position]['code'] == DUPLICATE_KEY and report.get('idempotencyKeys'):
+                # A concurrent retry stored the same key first
+                raced[report['idempotencyKeys'][0]] = index
+            else:
+                results[index] = {"status": "error", "id": None, "error": errors[position]['errmsg']}
+        elif 'clusterKey' not in report or position in upserted:
+            report.setdefault('_id', upserted.get(position))
+            results[index] = {"status": "created", "id": report['_id']}
+            created.append(report)
+        else:
+            merged.append(index)
+
+    if raced:
+        found = _existing_ids(set(raced))
+        for key, index in raced.items():
+            results[index] = {"status": "duplicate", "id": found.get(key)}
+
+    if merged:
+        clusters = {reports[index]['clusterKey'] for index in merged}
+        incidents = {
+            incident['clusterKey']: incident['_id']
+            for incident in mongo.db.reports.find({"clusterKey": {"$in": list(clusters)}}, {"clusterKey": 1})
+        }
+        for index in merged:
+            results[index] = {"status": "merged", "id": incidents.get(reports[index]['clusterKey'])}
+    merged = [(results[index]['id'], reports[index]) for index in merged]
+
+    if retry:
+        _recover(reports, results, created, merged)
+    for index, first in repeats.items():
+        results[index] = results[first] if results[first]['status'] == "error" else {"status": "duplicate", "id": results[first]['id']}
+
+    if created:
+        report_hooks.reports_created(created)
+    if merged:
+        report_hooks.reports_merged(merged)
+    return results
+
+
+def _recover(reports, results, created, merged):
+    """
+    Turn the duplicates of a retried batch back into creations and merges:
+    a stored report whose first key is the report's own was created by it,
+    otherwise the report was merged into that incident.
+    """
+    duplicates = {index: result['id'] for index, result in enumerate(results) if result['status'] == "duplicate"}
+    if not duplicates:
+        return
+    stored = {doc['_id']: doc for doc in mongo.db.reports.find({"_id": {"$in": list(set(duplicates.values()))}})}
+    for index, report_id in duplicates.items():
+        doc = stored.get(report_id)
+        if doc is None:
+            continue
+        if doc['idempotencyKeys'][0] == reports[index]['idempotencyKeys'][0]:
+            results[index] = {"status": "created", "id": report_id}
+            # Reports merged into it since are counted by their own merges
+            created.append({**doc, "reportCount": 1})
+        else:
+            results[index] = {"status": "merged", "id": report_id}
+            merged.append((report_id, reports[index]))
+
+
+def insert_report(report):
+    """insert_reports for a single report; returns its result."""
+    return insert_reports([report])[0]
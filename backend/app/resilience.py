@@ -0,0 +1,322 @@
+"""
+Degraded-mode serving for read endpoints when MongoDB is slow or down.
+
+    @analytics_bp.route('/api/heatmap')
+    @resilience.degradable()
+    @cache.cached('reports')
+    def get_heatmap_data(): ...
+
+- Budget: the view's queries run under `pymongo.timeout` (MONGO_READ_BUDGET_MS
+  unless the route passes `budget_ms`), which also bounds server selection,
+  so a slow or unreachable server cannot hold a worker thread for long.
+- Snapshots: every successful response is kept in memory, per endpoint and
+  query string, for STALE_SNAPSHOT_SECONDS.
+- Circuit breaker: MONGO_BREAKER_THRESHOLD connection errors or timeouts in
+  a row open it. While it is open, degradable routes do not touch MongoDB
+  for MONGO_BREAKER_COOLDOWN_SECONDS; after that a single request (or
+  background refresh) is let through to probe it, and its success closes it.
+- Fallback: when the database fails or the breaker is open the last good
+  snapshot is served with `Warning: 110`, `X-Data-Stale: true` and `Age`
+  headers, and one background refresh per snapshot retries the view. Without
+  a snapshot the route answers 503 with Retry-After instead of the raw
+  error.
+
+Views must let PyMongoError propagate (re-raise it from their generic
+`except Exception` handler) for this to see it. Only use it on routes whose
+response depends on nothing but the path and query string.
+
+The sections of composite responses (the dashboards) are coroutines on
+async_mongo instead: `guarded` awaits one under the budget and the breaker,
+and `keep_section`/`section_snapshot` hold the last good JSON of each.
+"""
+import logging
+import threading
+import time
+from functools import wraps
+import pymongo
+from flask import current_app, jsonify, make_response, request
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, PyMongoError
+from app.cache import SimpleCache
+
+logger = logging.getLogger(__name__)
+
+MAX_REFRESH_ATTEMPTS = 8
+# Section errors: the database is down (or the breaker open), or anything else
+UNAVAILABLE = "unavailable"
+FAILED = "failed"
+# Response headers a snapshot keeps besides its body and mimetype
+SNAPSHOT_HEADERS = ("X-Next-Cursor", "Last-Modified")
+
+
+def is_outage(error):
+    """True for errors that mean the database is unreachable or too slow, not that the query is wrong."""
+    return isinstance(error, (ConnectionFailure, ExecutionTimeout)) or getattr(error, 'timeout', False)
+
+
+class CircuitBreaker:
+
+    def __init__(self, threshold=5, cooldown=10):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        """True if a call may go to the database. Once cooled down, lets one probe through at a time."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("MongoDB is back, closing the circuit breaker")
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release(self):
+        """End a call that neither succeeded nor failed against the database, freeing the probe."""
+        with self._lock:
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                if self._opened_at is None:
+                    logger.warning("Opening the circuit breaker after %d MongoDB failures", self._failures)
+                self._opened_at = time.monotonic()
+
+
+class Resilience:
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.budget_ms = 2000
+        self.snapshot_seconds = 86400
+        self.snapshot_max_bytes = 2 * 1024 * 1024
+        self._snapshots = SimpleCache(256)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.breaker = CircuitBreaker(
+            app.config.get('MONGO_BREAKER_THRESHOLD', 5),
+            app.config.get('MONGO_BREAKER_COOLDOWN_SECONDS', 10),
+        )
+        self.budget_ms = app.config.get('MONGO_READ_BUDGET_MS', 2000)
+        self.snapshot_seconds = app.config.get('STALE_SNAPSHOT_SECONDS', 86400)
+        self.snapshot_max_bytes = app.config.get('STALE_SNAPSHOT_MAX_BYTES', 2 * 1024 * 1024)
+        self._snapshots = SimpleCache(app.config.get('STALE_SNAPSHOT_MAX_ENTRIES', 256))
+
+    # ---------------------------
+    # Snapshots
+    # ---------------------------
+    def _store(self, key, response, body):
+        if len(body) > self.snapshot_max_bytes:
+            return
+        headers = {name: response.headers[name] for name in SNAPSHOT_HEADERS if name in response.headers}
+        snapshot = {"body": body, "mimetype": response.mimetype, "headers": headers, "at": time.time()}
+        self._snapshots.set(key, snapshot, self.snapshot_seconds)
+
+    def _keep_streamed(self, response, key, budget):
+        """
+        Run the rest of a streamed response under the budget too, and keep
+        it as the snapshot if it completes and is small enough.
+        """
+        chunks, size = [], 0
+        iterator = iter(response.response)
+
+        def generate():
+            nonlocal chunks, size
+            while True:
+                with pymongo.timeout(budget):
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        break
+                    except PyMongoError as e:
+                        # Too late to fall back, but the breaker still hears of it
+                        if is_outage(e):
+                            self.breaker.failure()
+                        raise
+                if chunks is not None:
+                    chunk_bytes = chunk.encode() if isinstance(chunk, str) else chunk
+                    size += len(chunk_bytes)
+                    if size <= self.snapshot_max_bytes:
+                        chunks.append(chunk_bytes)
+                    else:
+                        chunks = None
+                yield chunk
+            if chunks is not None:
+                self._store(key, response, b"".join(chunks))
+
+        response.response = generate()
+        return response
+
+    def unavailable(self):
+        """503 with Retry-After, for when there is nothing to serve."""
+        response = jsonify({"error": "The database is temporarily unavailable, please retry shortly"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(self.breaker.cooldown))
+        return response
+
+    def _fallback(self, key):
+        """Stale snapshot for `key`, or 503."""
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return self.unavailable()
+        response = make_response(snapshot["body"], 200)
+        response.mimetype = snapshot["mimetype"]
+        response.headers.update(snapshot["headers"])
+        response.headers['Warning'] = '110 - "Response is Stale"'
+        response.headers['X-Data-Stale'] = 'true'
+        response.headers['Age'] = str(int(time.time() - snapshot["at"]))
+        response.cache_control.no_cache = True
+        return response
+
+    # ---------------------------
+    # Background refresh
+    # ---------------------------
+    def _schedule_refresh(self, key, view, budget):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        app = current_app._get_current_object()
+        target = (request.path, request.query_string.decode(), dict(request.view_args or {}))
+        threading.Thread(
+            target=self._refresh, args=(app, key, view, budget, target), name="stale-refresh", daemon=True
+        ).start()
+
+    def _refresh(self, app, key, view, budget, target):
+        path, query_string, view_args = target
+        delay = 0.5
+        try:
+            for _ in range(MAX_REFRESH_ATTEMPTS):
+                time.sleep(delay)
+                delay = min(delay * 2, max(self.breaker.cooldown, 1))
+                if not self.breaker.allow():
+                    continue
+                try:
+                    with app.test_request_context(path, query_string=query_string):
+                        with pymongo.timeout(budget):
+                            response = make_response(view(**view_args))
+                            body = response.get_data()
+                except PyMongoError as e:
+                    if not is_outage(e):
+                        self.breaker.success()
+                        return
+                    self.breaker.failure()
+                    continue
+                except BaseException:
+                    self.breaker.release()
+                    raise
+                self.breaker.success()
+                if response.status_code == 200:
+                    self._store(key, response, body)
+                return
+        except Exception:
+            logger.exception("Refreshing %s failed", path)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    # ---------------------------
+    # Sections
+    # ---------------------------
+    async def guarded(self, coroutine, budget_ms=None):
+        """
+        Await a section's `coroutine` on async_mongo within the budget, unless
+        the breaker is open. Returns (data, None) or (None, UNAVAILABLE | FAILED).
+        """
+        if not self.breaker.allow():
+            coroutine.close()
+            return None, UNAVAILABLE
+        try:
+            # Set inside the coroutine: the budget is a contextvar of its task
+            with pymongo.timeout((budget_ms or self.budget_ms) / 1000):
+                data = await coroutine
+        except PyMongoError as e:
+            if is_outage(e):
+                self.breaker.failure()
+                logger.warning("Dashboard section unavailable after %s", type(e).__name__)
+                return None, UNAVAILABLE
+            self.breaker.success()
+            logger.exception("Dashboard section failed")
+            return None, FAILED
+        except Exception:
+            self.breaker.release()
+            logger.exception("Dashboard section failed")
+            return None, FAILED
+        except BaseException:
+            # Cancelled: says nothing about the database
+            self.breaker.release()
+            raise
+        self.breaker.success()
+        return data, None
+
+    def keep_section(self, key, body):
+        """Keep the JSON `body` of a section as its snapshot."""
+        if len(body) <= self.snapshot_max_bytes:
+            self._snapshots.set(key, {"body": body, "at": time.time()}, self.snapshot_seconds)
+
+    def section_snapshot(self, key):
+        """(JSON body, age in seconds) of the last good section for `key`, or None."""
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return None
+        return snapshot["body"], int(time.time() - snapshot["at"])
+
+    # ---------------------------
+    # Decorator
+    # ---------------------------
+    def degradable(self, budget_ms=None):
+        """Serve the decorated read view within a time budget, falling back as the module docstring describes."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                budget = (budget_ms or self.budget_ms) / 1000
+                key = "|".join([request.endpoint, repr(sorted(request.args.items(multi=True)))])
+
+                if not self.breaker.allow():
+                    self._schedule_refresh(key, view, budget)
+                    return self._fallback(key)
+                try:
+                    with pymongo.timeout(budget):
+                        response = make_response(view(*args, **kwargs))
+                except PyMongoError as e:
+                    if not is_outage(e):
+                        self.breaker.success()
+                        return jsonify({"error": str(e)}), 500
+                    self.breaker.failure()
+                    logger.warning("Serving %s degraded after %s", request.path, type(e).__name__)
+                    self._schedule_refresh(key, view, budget)
+                    return self._fallback(key)
+                except BaseException:
+                    self.breaker.release()
+                    raise
+
+                self.breaker.success()
+                if response.status_code == 200:
+                    if response.is_streamed:
+                        return self._keep_streamed(response, key, budget)
+                    self._store(key, response, response.get_data())
+                return response
+            return wrapper
+        return decorator
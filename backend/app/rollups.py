@@ -0,0 +1,209 @@
+"""
+Hourly and daily report counts, maintained incrementally.
+
+The `report_rollups` collection holds one document per granularity, time
+bucket, location, issue type and priority:
+
+    {"granularity": "hour" | "day", "bucket": <bucket start, UTC>,
+     "location", "issueType", "priority",
+     "reported": <reports made>, "opened": <incidents opened>,
+     "resolved": <incidents resolved>, "updatedAt"}
+
+Report hooks `$inc` the buckets of every report, merge and resolution, so
+trend queries read a few hundred small documents instead of the reports
+collection. `rebuild` recomputes the counters from the reports themselves.
+"""
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from app.extensions import mongo
+
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+COUNTERS = ["reported", "opened", "resolved"]
+DIMENSIONS = ["location", "issueType", "priority"]
+
+
+def bucket_start(when, granularity):
+    """Start of the `granularity` bucket holding `when`."""
+    if granularity == "day":
+        return when.replace(hour=0, minute=0, second=0, microsecond=0)
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def _dimensions(report):
+    # Normalized like the heatmap, so "HIGH" and "high" share a bucket
+    return {
+        "location": report.get('location') or "Unknown",
+        "issueType": (report.get('issueType') or "Other").strip(),
+        "priority": (report.get('priority') or "Unknown").upper(),
+    }
+
+
+def _record(events):
+    """Add (when, report, counters) events to their hour and day buckets, one update per bucket."""
+    totals = {}
+    for when, report, counters in events:
+        if when is None:
+            continue
+        dimensions = tuple(_dimensions(report).items())
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(when, granularity), dimensions)
+            bucket = totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for counter, amount in counters.items():
+                bucket[counter] += amount
+    if not totals:
+        return
+    now = datetime.utcnow()
+    mongo.db.report_rollups.bulk_write([
+        UpdateOne(
+            {"granularity": granularity, "bucket": bucket, **dict(dimensions)},
+            {"$inc": counters, "$set": {"updatedAt": now}},
+            upsert=True
+        )
+        for (granularity, bucket, dimensions), counters in totals.items()
+    ], ordered=False)
+
+
+def reports_created(reports):
+    """Count newly stored reports, each opening an incident."""
+    _record((report.get('timestamp'), report, {"reported": report.get('reportCount', 1), "opened": 1}) for report in reports)
+
+
+def reports_merged(reports):
+    """Count reports merged into an open incident."""
+    _record((report.get('timestamp'), report, {"reported": 1}) for report in reports)
+
+
+def report_resolved(report):
+    """Count a resolution, in the bucket of its `resolvedAt`."""
+    _record([(report.get('resolvedAt'), report, {"resolved": 1})])
+
+
+def report_deleted(report):
+    """Take a deleted report (the document as it was) back out of every bucket that counted it."""
+    _record([
+        (report.get('timestamp'), report, {"reported": -report.get('reportCount', 1), "opened": -1}),
+        (report.get('resolvedAt'), report, {"resolved": -1}),
+    ])
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+def trend_pipeline(granularity, start, end, filters=None, group_by=None):
+    """
+    Aggregation over report_rollups summing the counters per bucket in
+    [start, end), oldest first. `filters` maps dimensions to lists of
+    values; `group_by` splits every bucket by one dimension.
+    """
+    match = {"granularity": granularity, "bucket": {"$gte": start, "$lt": end}}
+    for dimension, values in (filters or {}).items():
+        match[dimension] = {"$in": values}
+    group_id = {"bucket": "$bucket"}
+    if group_by:
+        group_id[group_by] = f"${group_by}"
+    return [
+        {"$match": match},
+        {"$group": {"_id": group_id, **{counter: {"$sum": f"${counter}"} for counter in COUNTERS}}},
+        {"$sort": {"_id.bucket": 1}},
+        {"$replaceWith": {"$mergeObjects": ["$_id", {counter: f"${counter}" for counter in COUNTERS}]}},
+    ]
+
+
+def summary_pipeline(now, days=7):
+    """
+    Aggregation over the daily rollups of the last `days` days giving the
+    reports made, incidents resolved, incidents resolved today and the
+    resolution rate (percent of incidents opened that were resolved).
+    """
+    today = bucket_start(now, "day")
+    return [
+        {"$match": {"granularity": "day", "bucket": {"$gt": today - timedelta(days=days)}}},
+        {
+            "$group": {
+                "_id": None,
+                "reported": {"$sum": "$reported"},
+                "opened": {"$sum": "$opened"},
+                "resolved": {"$sum": "$resolved"},
+                "resolvedToday": {"$sum": {"$cond": [{"$eq": ["$bucket", today]}, "$resolved", 0]}},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "reported": 1,
+                "resolved": 1,
+                "resolvedToday": 1,
+                "resolutionRate": {
+                    "$cond": [
+                        {"$gt": ["$opened", 0]},
+                        {"$round": [{"$multiply": [{"$divide": ["$resolved", "$opened"]}, 100]}, 0]},
+                        0,
+                    ]
+                },
+            }
+        },
+    ]
+
+
+def fill_buckets(rows, granularity, start, end):
+    """Per-bucket rows from trend_pipeline (without group_by) with empty buckets as zeros."""
+    by_bucket = {row['bucket']: row for row in rows}
+    step = GRANULARITIES[granularity]
+    bucket = bucket_start(start, granularity)
+    filled = []
+    while bucket < end:
+        filled.append(by_bucket.get(bucket, {"bucket": bucket, **dict.fromkeys(COUNTERS, 0)}))
+        bucket += step
+    return filled
+
+
+# ---------------------------
+# Backfill
+# ---------------------------
+def _rebuild_pipeline(granularity, date_field, counters):
+    return [
+        {"$match": {date_field: {"$type": "date"}}},
+        {
+            "$group": {
+                "_id": {
+                    "bucket": {"$dateTrunc": {"date": f"${date_field}", "unit": granularity}},
+                    "location": {"$ifNull": ["$location", "Unknown"]},
+                    "issueType": {"$trim": {"input": {"$ifNull": ["$issueType", "Other"]}}},
+                    "priority": {"$toUpper": {"$ifNull": ["$priority", "Unknown"]}},
+                },
+                **counters,
+            }
+        },
+        {
+            "$replaceWith": {
+                "$mergeObjects": ["$_id", {"granularity": granularity, "updatedAt": "$$NOW"}, {c: f"${c}" for c in counters}]
+            }
+        },
+        {
+            "$merge": {
+                "into": "report_rollups",
+                "on": ["granularity", "bucket", *DIMENSIONS],
+                "whenMatched": "merge",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+
+
+def rebuild(db):
+    """
+    Recompute every counter from the reports collection. The collection is
+    emptied first, so buckets no report falls in any more do not keep old
+    counts, and this is safe to run again. The passes for report and
+    resolution times merge into the same buckets, on the unique
+    report_rollups index. `$dateTrunc` needs MongoDB 5.0.
+    """
+    db.report_rollups.delete_many({})
+    for granularity in GRANULARITIES:
+        db.reports.aggregate(_rebuild_pipeline(granularity, "timestamp", {
+            "reported": {"$sum": {"$ifNull": ["$reportCount", 1]}},
+            "opened": {"$sum": 1},
+        }))
+        db.reports.aggregate(_rebuild_pipeline(granularity, "resolvedAt", {
+            "resolved": {"$sum": 1},
+        }))
@@ -52,8 +52,10 @@
 
 from flask import Blueprint, request, jsonify
 from app.extensions import mongo
+from app import report_hooks, report_status
+from app.json_provider import json_list_response
 from bson import ObjectId
-from datetime import datetime
+from bson.errors import InvalidId
 
 admin_bp = Blueprint("admin_updates", __name__)
 
@@ -66,26 +68,28 @@ def resolve_issue():
 
     if not report_id or not issue_type or not location:
         return jsonify({"message": "Missing data"}), 400
-
-    # This endpoint is currently redundant if /api/reports/<report_id>/resolve is used for initial admin action
-    # However, keeping it as is, but the primary logic will be in the report_routes resolve endpoint now.
-    mongo.db.admin_updates.insert_one({
-        "reportId": ObjectId(report_id),
-        "issueType": issue_type,
-        "location": location,
-        "timestamp": datetime.utcnow()
-    })
+    try:
+        report_id = ObjectId(report_id)
+    except InvalidId:
+        return jsonify({"message": "Invalid reportId"}), 400
+
+    # Same transition as /api/reports/<report_id>/resolve; the dashboard calls
+    # both, so a report that is already resolved is not an error
+    report, changed = report_status.advance(report_id, report_status.RESOLVED_BY_ADMIN)
+    if not report:
+        return jsonify({"message": "Report not found"}), 404
+    if changed:
+        report_hooks.report_resolved(report)
+    elif report['status'] != report_status.RESOLVED_BY_ADMIN:
+        return jsonify({"message": f"Report is {report['status']}, not pending"}), 409
 
     return jsonify({"message": "Update sent to user"}), 200
 
 
 @admin_bp.route("/api/admin/updates", methods=["GET"])
 def get_admin_updates():
-    updates = list(mongo.db.admin_updates.find().sort("timestamp", -1))
-    for update in updates:
-        update["_id"] = str(update["_id"])
-        update["reportId"] = str(update["reportId"])
-    return jsonify(updates), 200
+    updates = mongo.db.reports.aggregate(report_status.admin_updates_pipeline())
+    return json_list_response(updates), 200
 
 
 @admin_bp.route("/api/admin/resolve-confirm", methods=["POST"])
@@ -95,9 +99,17 @@ def confirm_resolution():
 
     if not report_id:
         return jsonify({"message": "reportId is required"}), 400
-
-    # Delete from reports and admin_updates
-    mongo.db.reports.delete_one({"_id": ObjectId(report_id)})
-    mongo.db.admin_updates.delete_one({"reportId": ObjectId(report_id)})
+    try:
+        report_id = ObjectId(report_id)
+    except InvalidId:
+        return jsonify({"message": "Invalid reportId"}), 400
+
+    report, changed = report_status.advance(report_id, report_status.CONFIRMED)
+    if not report:
+        return jsonify({"message": "Report not found"}), 404
+    if changed:
+        report_hooks.report_confirmed(report_id)
+    elif report['status'] != report_status.CONFIRMED:
+        return jsonify({"message": f"Report is {report['status']}, not resolved by an admin"}), 409
 
     return jsonify({"message": "Report marked as resolved"}), 200
\ No newline at end of file
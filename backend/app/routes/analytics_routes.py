@@ -1,11 +1,31 @@
-from flask import Blueprint, jsonify
-from app.extensions import mongo
+from flask import Blueprint, request, jsonify
+from app.extensions import mongo, cache, heatmap_cube, resilience
+from app import facilities, location_status, report_status, rollups
+from app.report_store import parse_timestamp
 from datetime import datetime, timedelta
 from collections import defaultdict
+from pymongo.errors import PyMongoError
+import time
 
 analytics_bp = Blueprint('analytics', __name__)
 
+def washroom_status(rows, now, registered):
+    """
+    Status entries for status_rows, plus every facility in `registered`
+    (or every default location, before facilities are registered) without
+    open reports as "good".
+    """
+    names = [facility['name'] for facility in registered] or facilities.DEFAULT_LOCATIONS
+    seen = {row["_id"] for row in rows}
+    rows = rows + [{"_id": name, "activeCount": 0, "highPriorityCount": 0} for name in names if name not in seen]
+    ids = {facility['name']: facility['_id'] for facility in registered}
+    return [{**location_status.describe(row, now), "facilityId": ids.get(row["_id"])} for row in rows]
+
+
 @analytics_bp.route('/api/washroom-status', methods=['GET'])
+@resilience.degradable()
+# "x mins ago" goes stale on its own, so keep this one short-lived
+@cache.cached('reports', timeout=30)
 def get_washroom_status():
     """
     Get washroom status based on recent reports.
@@ -15,171 +35,50 @@ def get_washroom_status():
     - 'issue': Has active critical issues
     """
     try:
-        # Get all locations from reports
-        reports = list(mongo.db.reports.find())
-        
-        # Get unique locations
-        locations = set()
-        for report in reports:
-            if report.get('location'):
-                locations.add(report['location'])
-        
-        # Default locations if no reports exist
-        default_locations = [
-            "Restroom - Ground Floor(010)",
-            "Restroom - First Floor(110)",
-            "Restroom - Second Floor(210)",
-            "Restroom - Third Floor(310)",
-            "Restroom - Fourth Floor(410)",
-            "Restroom - Fifth Floor(510)",
-            "Restroom - Sixth Floor(610)",
-        ]
-        
-        # Use default locations if no reports
-        if not locations:
-            locations = set(default_locations)
-        
-        # Check resolved locations
-        resolved_reports = list(mongo.db.admin_updates.find())
-        resolved_location_ids = set()
-        for update in resolved_reports:
-            if update.get('reportId'):
-                resolved_location_ids.add(str(update.get('reportId')))
-        
-        # Calculate status for each location
-        washroom_status = []
         now = datetime.utcnow()
         one_day_ago = now - timedelta(days=1)
-        
-        for location in locations:
-            # Get recent reports for this location (last 24 hours)
-            recent_reports = [
-                r for r in reports 
-                if r.get('location') == location 
-                and r.get('timestamp')
-            ]
-            
-            # Filter by timestamp if available
-            active_reports = []
-            for report in recent_reports:
-                report_id = str(report.get('_id'))
-                # Check if not resolved
-                if report_id in resolved_location_ids:
-                    continue
-                    
-                report_time = report.get('timestamp')
-                parsed_time = None
-                
-                if isinstance(report_time, dict) and '$date' in report_time:
-                    # MongoDB date format
-                    if isinstance(report_time['$date'], (int, float)):
-                        parsed_time = datetime.fromtimestamp(report_time['$date'] / 1000)
-                    else:
-                        parsed_time = report_time['$date']
-                elif isinstance(report_time, str):
-                    try:
-                        # Try ISO format
-                        parsed_time = datetime.fromisoformat(report_time.replace('Z', '+00:00'))
-                    except:
-                        try:
-                            # Try other common formats
-                            parsed_time = datetime.strptime(report_time, '%Y-%m-%dT%H:%M:%S.%f')
-                        except:
-                            parsed_time = None
-                elif isinstance(report_time, datetime):
-                    parsed_time = report_time
-                
-                # Include report if timestamp is recent or if timestamp parsing failed (to be safe)
-                if parsed_time is None or parsed_time >= one_day_ago:
-                    active_reports.append(report)
-            
-            # Determine status
-            if not active_reports:
-                status = "good"
-                last_updated = "No recent issues"
-            else:
-                # Check priority levels
-                high_priority_count = sum(1 for r in active_reports if r.get('priority', '').upper() in ['HIGH', 'HIGH PRIORITY'])
-                if high_priority_count > 0:
-                    status = "issue"
-                else:
-                    status = "maintenance"
-                
-                # Get most recent report time
-                def parse_timestamp(ts):
-                    if isinstance(ts, dict) and '$date' in ts:
-                        if isinstance(ts['$date'], (int, float)):
-                            return datetime.fromtimestamp(ts['$date'] / 1000)
-                        return ts['$date']
-                    elif isinstance(ts, str):
-                        try:
-                            return datetime.fromisoformat(ts.replace('Z', '+00:00'))
-                        except:
-                            try:
-                                return datetime.strptime(ts, '%Y-%m-%dT%H:%M:%S.%f')
-                            except:
-                                return datetime.min
-                    elif isinstance(ts, datetime):
-                        return ts
-                    return datetime.min
-                
-                latest_report = max(active_reports, key=lambda x: parse_timestamp(x.get('timestamp')))
-                report_time = parse_timestamp(latest_report.get('timestamp'))
-                if report_time == datetime.min:
-                    report_time = now
-                
-                # Calculate time ago
-                time_diff = now - report_time
-                if time_diff.total_seconds() < 3600:  # Less than 1 hour
-                    minutes = int(time_diff.total_seconds() / 60)
-                    last_updated = f"{minutes} mins ago" if minutes > 0 else "Just now"
-                elif time_diff.total_seconds() < 86400:  # Less than 24 hours
-                    hours = int(time_diff.total_seconds() / 3600)
-                    last_updated = f"{hours} hour{'s' if hours > 1 else ''} ago"
-                else:
-                    days = int(time_diff.total_seconds() / 86400)
-                    last_updated = f"{days} day{'s' if days > 1 else ''} ago"
-            
-            washroom_status.append({
-                "name": location,
-                "status": status,
-                "lastUpdated": last_updated
-            })
-        
-        return jsonify(washroom_status), 200
+
+        rows = location_status.read_status(one_day_ago)
+        return jsonify(washroom_status(rows, now, facilities.registry.all())), 200
+    except PyMongoError:
+        # Served stale or as 503 by @resilience.degradable
+        raise
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
 
 @analytics_bp.route('/api/heatmap', methods=['GET'])
+@resilience.degradable()
+@cache.cached('reports', timeout=600)
 def get_heatmap_data():
     """
     Get heatmap data grouped by location and issue category.
     Returns data in format suitable for heatmap visualization.
     """
     try:
-        reports = list(mongo.db.reports.find())
-        
+        # Count unresolved incidents per location and category in the database,
+        # and the reports merged into them
+        counts = mongo.db.reports.aggregate([
+            {"$match": {"status": report_status.PENDING}},
+            {
+                "$group": {
+                    "_id": {
+                        "location": {"$ifNull": ["$location", "Unknown"]},
+                        # Normalize category names
+                        "category": {"$trim": {"input": {"$ifNull": ["$issueType", "Other"]}}},
+                    },
+                    "count": {"$sum": 1},
+                    "reports": {"$sum": {"$ifNull": ["$reportCount", 1]}},
+                }
+            },
+        ])
+
         # Group by location and category
         heatmap_data = defaultdict(lambda: defaultdict(int))
-        
-        # Get resolved reports to exclude
-        resolved_reports = list(mongo.db.admin_updates.find())
-        resolved_report_ids = {str(update.get('reportId')) for update in resolved_reports if update.get('reportId')}
-        
-        for report in reports:
-            report_id = str(report.get('_id'))
-            # Skip resolved reports
-            if report_id in resolved_report_ids:
-                continue
-            
-            location = report.get('location', 'Unknown')
-            category = report.get('issueType', 'Other')
-            
-            # Normalize category names
-            category = category.strip()
-            
-            heatmap_data[location][category] += 1
+        report_counts = defaultdict(lambda: defaultdict(int))
+        for row in counts:
+            heatmap_data[row['_id']['location']][row['_id']['category']] += row['count']
+            report_counts[row['_id']['location']][row['_id']['category']] += row['reports']
         
         # Convert to list format
         result = []
@@ -188,7 +87,8 @@ def get_heatmap_data():
                 result.append({
                     "location": location,
                     "category": category,
-                    "count": count
+                    "count": count,
+                    "reports": report_counts[location][category]
                 })
         
         # Also return summary by location
@@ -197,6 +97,7 @@ def get_heatmap_data():
             total = sum(categories.values())
             location_summary[location] = {
                 "total": total,
+                "reports": sum(report_counts[location].values()),
                 "categories": dict(categories)
             }
         
@@ -204,6 +105,143 @@ def get_heatmap_data():
             "data": result,
             "summary": location_summary
         }), 200
+    except PyMongoError:
+        # Served stale or as 503 by @resilience.degradable
+        raise
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+
+# ---------------------------
+# Heatmap Cube (slice and roll up recent reports)
+# ---------------------------
+def _csv(name):
+    values = [v.strip() for v in request.args.get(name, '').split(',') if v.strip()]
+    return values or None
+
+
+def _floors(value):
+    """Floor numbers from "1-3" or "0,2,5"."""
+    floors = set()
+    for part in value.split(','):
+        low, _, high = part.strip().partition('-')
+        floors.update(range(int(low), int(high or low) + 1))
+    return floors
+
+
+@analytics_bp.route('/api/heatmap/cube', methods=['GET'])
+def get_heatmap_cube():
+    """
+    Report counts over the last HEATMAP_CUBE_DAYS days, sliced and rolled
+    up in memory. Query params: `days` (or `from`/`to` ISO dates),
+    comma separated `location`, `building`, `category` and `priority`
+    filters, `floors` ("1-3" or "0,2"), and `rows`/`columns` (location,
+    building, floor, category or priority; default location x category). The response carries the
+    matrix with its totals, maxima and color bins.
+    """
+    if not heatmap_cube.available:
+        return jsonify({"error": "The heatmap cube requires numpy"}), 501
+    try:
+        started = time.perf_counter()
+        rows = request.args.get('rows', 'location')
+        columns = request.args.get('columns', 'category')
+        for name, dimension in (('rows', rows), ('columns', columns)):
+            if dimension not in ('location', 'building', 'floor', 'category', 'priority'):
+                return jsonify({"message": f"{name} must be location, building, floor, category or priority"}), 400
+        try:
+            floors = _floors(request.args['floors']) if request.args.get('floors') else None
+            days = float(request.args['days']) if request.args.get('days') else None
+        except ValueError:
+            return jsonify({"message": "floors must look like 1-3 or 0,2 and days must be a number"}), 400
+        for param in ('from', 'to'):
+            if request.args.get(param) and parse_timestamp(request.args[param]) is None:
+                return jsonify({"message": f"{param} must be an ISO 8601 date"}), 400
+
+        end = parse_timestamp(request.args.get('to'))
+        start = parse_timestamp(request.args.get('from'))
+        if days is not None:
+            start = (end or datetime.utcnow()) - timedelta(days=days)
+        priorities = _csv('priority')
+
+        try:
+            result = heatmap_cube.query(
+                start=start, end=end,
+                locations=_csv('location'), buildings=_csv('building'), floors=floors, categories=_csv('category'),
+                priorities=[p.upper() for p in priorities] if priorities else None,
+                rows=rows, columns=columns,
+            )
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        window_start, window_end = heatmap_cube.window()
+        result["from"] = max(start, window_start) if start else window_start
+        result["to"] = min(end, window_end) if end else window_end
+        result["computeMs"] = round((time.perf_counter() - started) * 1000, 2)
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+# ---------------------------
+# Report Trends
+# ---------------------------
+# Default range per granularity, and the most buckets one request may span
+TREND_DEFAULT_RANGE = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+MAX_TREND_BUCKETS = 1000
+
+
+@analytics_bp.route('/api/analytics/trends', methods=['GET'])
+@cache.cached('reports', timeout=60)
+def get_trends():
+    """
+    Reports made, incidents opened and incidents resolved per hour or day,
+    read from the report rollups.
+
+    Query params: `granularity` (hour|day, default day), `from`/`to` (ISO
+    dates, default the last 48 hours or 30 days), comma separated
+    `location`, `issueType` and `priority` filters, and `groupBy` (one of
+    location, issueType, priority) to split every bucket. Without groupBy
+    every bucket in the range is returned, empty ones as zeros.
+    """
+    try:
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in rollups.GRANULARITIES:
+            return jsonify({"message": "granularity must be hour or day"}), 400
+        group_by = request.args.get('groupBy')
+        if group_by and group_by not in rollups.DIMENSIONS:
+            return jsonify({"message": f"groupBy must be one of {', '.join(rollups.DIMENSIONS)}"}), 400
+
+        for param in ('from', 'to'):
+            if request.args.get(param) and parse_timestamp(request.args[param]) is None:
+                return jsonify({"message": f"{param} must be an ISO 8601 date"}), 400
+
+        step = rollups.GRANULARITIES[granularity]
+        # Both ends are widened to whole buckets; `to`'s bucket is included
+        end = rollups.bucket_start(parse_timestamp(request.args.get('to')) or datetime.utcnow(), granularity) + step
+        start = parse_timestamp(request.args.get('from')) or end - TREND_DEFAULT_RANGE[granularity]
+        start = rollups.bucket_start(start, granularity)
+        if start >= end:
+            return jsonify({"message": "from must be before to"}), 400
+        if (end - start) / step > MAX_TREND_BUCKETS:
+            return jsonify({"message": f"At most {MAX_TREND_BUCKETS} {granularity} buckets per request"}), 400
+
+        filters = {}
+        for dimension in rollups.DIMENSIONS:
+            if request.args.get(dimension):
+                values = [v.strip() for v in request.args[dimension].split(',') if v.strip()]
+                filters[dimension] = [v.upper() for v in values] if dimension == 'priority' else values
+
+        rows = list(mongo.db.report_rollups.aggregate(
+            rollups.trend_pipeline(granularity, start, end, filters, group_by)
+        ))
+        if not group_by:
+            rows = rollups.fill_buckets(rows, granularity, start, end)
+
+        return jsonify({
+            "granularity": granularity,
+            "from": start,
+            "to": end,
+            "groupBy": group_by,
+            "series": rows,
+            "totals": {counter: sum(row[counter] for row in rows) for counter in rollups.COUNTERS},
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
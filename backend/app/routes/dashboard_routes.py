@@ -0,0 +1,206 @@
+from flask import Blueprint, request, jsonify, current_app
+from app.extensions import async_mongo, cache, resilience
+from app import facilities, location_status, report_status, rollups
+from app.resilience import UNAVAILABLE, is_outage
+from app.routes.analytics_routes import washroom_status
+from app.routes.discussion_routes import discussions_query, discussion_stats_pipeline, discussion_stats
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from datetime import datetime, timedelta, timezone
+from werkzeug.http import http_date
+import hashlib
+import pymongo
+from pymongo.errors import PyMongoError
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+RECENT_REPORTS = 20
+RECENT_REPORT_FIELDS = {"issueType": 1, "location": 1, "priority": 1, "details": 1, "timestamp": 1, "reportCount": 1, "facilityId": 1}
+ADMIN_REPORT_FIELDS = {"issueType": 1, "priority": 1, "details": 1, "location": 1, "timestamp": 1, "status": 1, "reportCount": 1, "facilityId": 1}
+
+# ---------------------------
+# Sections: coroutines run concurrently on async_mongo
+# ---------------------------
+async def recent_reports(params):
+    return await (
+        async_mongo.db.reports.find({"status": {"$in": report_status.OPEN_STATUSES}}, RECENT_REPORT_FIELDS)
+        .sort([("timestamp", -1), ("_id", -1)])
+        .limit(RECENT_REPORTS)
+        .to_list()
+    )
+
+
+async def my_reports(params):
+    if not params['email']:
+        return []
+    return await (
+        async_mongo.db.reports.find(
+            {"reporterEmails": params['email'], "status": {"$in": report_status.OPEN_STATUSES}},
+            report_status.PRIVATE_PROJECTION
+        )
+        .sort("timestamp", -1)
+        .to_list()
+    )
+
+
+async def open_reports(params):
+    return await (
+        async_mongo.db.reports.find({"status": {"$in": report_status.OPEN_STATUSES}}, ADMIN_REPORT_FIELDS)
+        .sort([("timestamp", -1), ("_id", -1)])
+        .to_list()
+    )
+
+
+async def admin_updates(params):
+    cursor = await async_mongo.db.reports.aggregate(report_status.admin_updates_pipeline())
+    return await cursor.to_list()
+
+
+async def stats(params):
+    active = await async_mongo.db.reports.count_documents({"status": report_status.PENDING})
+    cursor = await async_mongo.db.report_rollups.aggregate(rollups.summary_pipeline(datetime.utcnow()))
+    summary = await cursor.to_list()
+    return {
+        "activeIssues": active,
+        **(summary[0] if summary else {"reported": 0, "resolved": 0, "resolvedToday": 0, "resolutionRate": 0}),
+    }
+
+
+async def washroom_statuses(params):
+    now = datetime.utcnow()
+    rows = await location_status.read_status_async(now - timedelta(days=1))
+    return washroom_status(rows, now, params['facilities'])
+
+
+async def discussions(params):
+    return await (
+        async_mongo.db.discussions.find(discussions_query(params['category']), {"comments": 0})
+        .sort("createdAt", -1)
+        .to_list()
+    )
+
+
+async def discussion_stats_section(params):
+    cursor = await async_mongo.db.discussions.aggregate(discussion_stats_pipeline())
+    result = await cursor.next()
+    return discussion_stats(result)
+
+
+# name -> (section, cache namespace its data depends on, params its data depends on)
+USER_SECTIONS = {
+    "recentReports": (recent_reports, "reports", ()),
+    "myReports": (my_reports, "reports", ("email",)),
+    "washroomStatus": (washroom_statuses, "reports", ()),
+    "adminUpdates": (admin_updates, "reports", ()),
+    "discussions": (discussions, "discussions", ("category",)),
+    "discussionStats": (discussion_stats_section, "discussions", ()),
+}
+
+ADMIN_SECTIONS = {
+    "reports": (open_reports, "reports", ()),
+    "adminUpdates": (admin_updates, "reports", ()),
+    "washroomStatus": (washroom_statuses, "reports", ()),
+    "stats": (stats, "reports", ()),
+}
+
+
+def snapshot_key(name, section, params):
+    return "|".join(["dashboard", name, *(str(params[param]) for param in section[2])])
+
+
+def dashboard_response(sections):
+    """
+    Run the requested sections concurrently and build the composite payload.
+
+    `?sections=a,b` selects sections (default: all). Every section carries
+    its own `etag` and `lastModified`; a client that sends back
+    `?etags=name:etag,...` gets `{"notModified": true}` instead of the data
+    of sections that did not change.
+
+    Sections run through resilience.guarded: while the database is down a
+    section is served from its last good snapshot with `"stale": true` and
+    its `age`, or as `{"error": "unavailable"}`; if no section could be
+    served the response is 503 with Retry-After.
+    """
+    requested = request.args.get('sections')
+    names = [name for name in requested.split(',') if name in sections] if requested else list(sections)
+    known = dict(item.split(':', 1) for item in request.args.get('etags', '').split(',') if ':' in item)
+
+    email = None
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+        if identity and isinstance(identity, dict):
+            email = identity.get('email')
+    except Exception:
+        email = None
+    # Read here: the registry reloads through the synchronous client
+    try:
+        with pymongo.timeout(resilience.budget_ms / 1000):
+            registered = facilities.registry.all()
+    except PyMongoError as e:
+        if not is_outage(e):
+            raise
+        return resilience.unavailable()
+    params = {"email": email, "category": request.args.get('category'), "facilities": registered}
+
+    results = async_mongo.gather(*(resilience.guarded(sections[name][0](params)) for name in names))
+
+    # Each section is encoded once: the same JSON is hashed for its etag and
+    # spliced into the response body
+    dumps = current_app.json.dumps
+    entries = []
+    unavailable = 0
+    for name, (data, error) in zip(names, results):
+        key = snapshot_key(name, sections[name], params)
+        age = None
+        if error == UNAVAILABLE:
+            snapshot = resilience.section_snapshot(key)
+            if snapshot is None:
+                unavailable += 1
+                entries.append(f'{dumps(name)}:{dumps({"error": error})}')
+                continue
+            body, age = snapshot
+        elif error is not None:
+            entries.append(f'{dumps(name)}:{dumps({"error": error})}')
+            continue
+        else:
+            body = dumps(data)
+            resilience.keep_section(key, body)
+        etag = hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+        version = cache.versions([sections[name][1]])[0]
+        entry = {
+            "etag": etag,
+            "lastModified": http_date(datetime.fromtimestamp(version / 1e9, timezone.utc)) if version else None,
+        }
+        if age is not None:
+            entry.update({"stale": True, "age": age})
+        if known.get(name) == etag:
+            entry["notModified"] = True
+            entries.append(f'{dumps(name)}:{dumps(entry)}')
+        else:
+            entries.append(f'{dumps(name)}:{dumps(entry)[:-1]},"data":{body}}}')
+    if names and unavailable == len(names):
+        return resilience.unavailable()
+    return current_app.response_class("{" + ",".join(entries) + "}", mimetype="application/json")
+
+# ---------------------------
+# User Dashboard
+# ---------------------------
+@dashboard_bp.route('/api/dashboard/user', methods=['GET'])
+def get_user_dashboard():
+    """Everything UserDashboard loads on mount; `category` filters the discussions section."""
+    try:
+        return dashboard_response(USER_SECTIONS)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ---------------------------
+# Admin Dashboard
+# ---------------------------
+@dashboard_bp.route('/api/dashboard/admin', methods=['GET'])
+def get_admin_dashboard():
+    """Everything AdminDashboard loads on mount."""
+    try:
+        return dashboard_response(ADMIN_SECTIONS)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
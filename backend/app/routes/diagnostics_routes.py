@@ -0,0 +1,49 @@
+import os
+from flask import Blueprint, request, jsonify, send_file
+from app.extensions import slow_queries, profiler
+from app.profiling import FORMATS
+from app.auth import admin_required
+
+diagnostics_bp = Blueprint('diagnostics', __name__)
+
+# ---------------------------
+# Slow Queries
+# ---------------------------
+@diagnostics_bp.route('/api/admin/diagnostics/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_queries():
+    """Slow finds and aggregates recorded by this worker, newest first (`limit`, default 50)."""
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 1000)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    return jsonify({
+        "enabled": slow_queries.enabled,
+        "thresholdMs": slow_queries.threshold_ms,
+        "entries": slow_queries.entries(limit),
+    }), 200
+
+# ---------------------------
+# Request Profiles
+# ---------------------------
+@diagnostics_bp.route('/api/admin/diagnostics/profiles', methods=['GET'])
+@admin_required
+def get_profiles():
+    """Stored request profiles of this machine, newest first."""
+    return jsonify({"enabled": profiler.enabled and bool(profiler.token), "profiles": profiler.runs()}), 200
+
+
+@diagnostics_bp.route('/api/admin/diagnostics/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def download_profile(profile_id):
+    """One artifact of a profile: `format` is txt (default), prof, memory or json."""
+    fmt = request.args.get('format', 'txt')
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    # Ids are generated by app.profiling; anything else is not a file of ours
+    if not profile_id.replace('-', '').isdigit():
+        return jsonify({"message": "Profile not found"}), 404
+    path = profiler.path(profile_id, fmt)
+    if not os.path.exists(path):
+        return jsonify({"message": "Profile not found"}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
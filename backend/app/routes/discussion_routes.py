@@ -1,83 +1,82 @@
 from flask import Blueprint, request, jsonify
-from app.extensions import mongo
+from app.extensions import mongo, async_mongo, cache, resilience
+from app.json_provider import json_list_response
+from app.pagination import after_cursor, encode_cursor
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import PyMongoError
 
 discussion_bp = Blueprint('discussions', __name__)
 
 # ---------------------------
 # Get All Discussions
 # ---------------------------
+def discussions_query(category):
+    """Filter for listing the discussions of a category ("All Posts" or None for all)."""
+    if category and category != "All Posts":
+        return {'tags': category.lower()}
+    return {}
+
+
 @discussion_bp.route('/api/discussions', methods=['GET'])
+@resilience.degradable()
 def get_all_discussions():
     try:
-        category = request.args.get('category', None)
-        query = {}
-        
         # Filter by category if provided
-        if category and category != "All Posts":
-            query['tags'] = category.lower()
-        
-        discussions = list(mongo.db.discussions.find(query).sort("createdAt", -1))
-        
-        for discussion in discussions:
-            discussion['_id'] = str(discussion['_id'])
-            # Handle datetime serialization
-            if 'createdAt' in discussion:
-                if hasattr(discussion['createdAt'], 'isoformat'):
-                    discussion['createdAt'] = discussion['createdAt'].isoformat()
-                elif isinstance(discussion['createdAt'], dict) and '$date' in discussion['createdAt']:
-                    from datetime import datetime
-                    discussion['createdAt'] = datetime.fromtimestamp(
-                        discussion['createdAt']['$date'] / 1000
-                    ).isoformat()
-            
-            # Count comments
-            discussion['commentCount'] = len(discussion.get('comments', []))
-            
-            # Don't send all comments in list view, just count
-            if 'comments' in discussion:
-                discussion.pop('comments')
+        query = discussions_query(request.args.get('category', None))
         
-        return jsonify(discussions), 200
+        discussions = mongo.db.discussions.find(query, {"comments": 0}).sort("createdAt", -1)
+        return json_list_response(discussions), 200
+    except PyMongoError:
+        # Served stale or as 503 by @resilience.degradable
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # ---------------------------
 # Get Single Discussion with Comments
 # ---------------------------
+COMMENTS_PAGE_SIZE = 50
+MAX_COMMENTS_PAGE_SIZE = 200
+
+
+async def comments_page(discussion_id, limit=COMMENTS_PAGE_SIZE, after=None):
+    """
+    Oldest-first page of a discussion's comments. Returns (comments, cursor)
+    where cursor is None on the last page. Runs on async_mongo.
+    """
+    query = {"discussionId": discussion_id}
+    if after:
+        query.update(after_cursor('createdAt', after, descending=False))
+    comments = await (
+        async_mongo.db.comments.find(query, {"discussionId": 0})
+        .sort([("createdAt", 1), ("_id", 1)])
+        .limit(limit)
+        .to_list()
+    )
+    next_cursor = None
+    if len(comments) == limit:
+        next_cursor = encode_cursor(comments[-1]['createdAt'], comments[-1]['_id'])
+    return comments, next_cursor
+
+
 @discussion_bp.route('/api/discussions/<discussion_id>', methods=['GET'])
 def get_discussion(discussion_id):
+    """Discussion with the first page of its comments; see get_comments for the rest."""
     try:
-        discussion = mongo.db.discussions.find_one({'_id': ObjectId(discussion_id)})
+        discussion_id = ObjectId(discussion_id)
+        # Both queries only need the id, so they run concurrently
+        discussion, (comments, next_cursor) = async_mongo.gather(
+            async_mongo.db.discussions.find_one({'_id': discussion_id}, {"comments": 0}),
+            comments_page(discussion_id),
+        )
         
         if not discussion:
             return jsonify({"error": "Discussion not found"}), 404
         
-        discussion['_id'] = str(discussion['_id'])
-        
-        # Handle datetime serialization
-        if 'createdAt' in discussion:
-            if hasattr(discussion['createdAt'], 'isoformat'):
-                discussion['createdAt'] = discussion['createdAt'].isoformat()
-            elif isinstance(discussion['createdAt'], dict) and '$date' in discussion['createdAt']:
-                from datetime import datetime
-                discussion['createdAt'] = datetime.fromtimestamp(
-                    discussion['createdAt']['$date'] / 1000
-                ).isoformat()
-        
-        # Serialize comments
-        if 'comments' in discussion:
-            for comment in discussion['comments']:
-                if 'createdAt' in comment:
-                    if hasattr(comment['createdAt'], 'isoformat'):
-                        comment['createdAt'] = comment['createdAt'].isoformat()
-                    elif isinstance(comment['createdAt'], dict) and '$date' in comment['createdAt']:
-                        from datetime import datetime
-                        comment['createdAt'] = datetime.fromtimestamp(
-                            comment['createdAt']['$date'] / 1000
-                        ).isoformat()
+        discussion['comments'], discussion['nextCommentsCursor'] = comments, next_cursor
         
         return jsonify(discussion), 200
     except Exception as e:
@@ -116,15 +115,13 @@ def create_discussion():
             "tags": data['tags'] if isinstance(data['tags'], list) else [data['tags']],
             "authorEmail": email,
             "createdAt": datetime.utcnow(),
-            "comments": [],
+            "commentCount": 0,
             "upvotes": 0,
             "downvotes": 0
         }
         
-        result = mongo.db.discussions.insert_one(discussion)
-        discussion['_id'] = str(result.inserted_id)
-        discussion['createdAt'] = discussion['createdAt'].isoformat()
-        discussion['commentCount'] = 0
+        mongo.db.discussions.insert_one(discussion)
+        cache.invalidate('discussions')
         
         return jsonify(discussion), 201
     except Exception as e:
@@ -140,11 +137,6 @@ def add_comment(discussion_id):
         if not data or not data.get('text'):
             return jsonify({"error": "Comment text is required"}), 400
         
-        # Check if discussion exists
-        discussion = mongo.db.discussions.find_one({'_id': ObjectId(discussion_id)})
-        if not discussion:
-            return jsonify({"error": "Discussion not found"}), 404
-        
         # Get user email if authenticated, otherwise anonymous
         email = "anonymous"
         try:
@@ -157,42 +149,98 @@ def add_comment(discussion_id):
         except Exception:
             email = "anonymous"
         
+        if not mongo.db.discussions.find_one({'_id': ObjectId(discussion_id)}, {'_id': 1}):
+            return jsonify({"error": "Discussion not found"}), 404
+        
         comment = {
+            "discussionId": ObjectId(discussion_id),
             "text": data['text'],
             "authorEmail": email,
-            "createdAt": datetime.utcnow(),
-            "_id": str(ObjectId())
+            "createdAt": datetime.utcnow()
         }
+        mongo.db.comments.insert_one(comment)
+        # Bump the denormalized count only once the comment is stored
+        mongo.db.discussions.update_one({'_id': ObjectId(discussion_id)}, {'$inc': {'commentCount': 1}})
         
-        # Add comment to discussion
-        mongo.db.discussions.update_one(
-            {'_id': ObjectId(discussion_id)},
-            {'$push': {'comments': comment}}
-        )
-        
-        comment['createdAt'] = comment['createdAt'].isoformat()
         return jsonify(comment), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# ---------------------------
+# Get Discussion Comments (paginated)
+# ---------------------------
+@discussion_bp.route('/api/discussions/<discussion_id>/comments', methods=['GET'])
+def get_comments(discussion_id):
+    """
+    Comments oldest first, `limit` per page (default 50). Pass the returned
+    `nextCursor` as `after` to fetch the following page.
+    """
+    try:
+        try:
+            limit = min(max(request.args.get('limit', COMMENTS_PAGE_SIZE, type=int), 1), MAX_COMMENTS_PAGE_SIZE)
+            comments, next_cursor = async_mongo.run(
+                comments_page(ObjectId(discussion_id), limit, request.args.get('after'))
+            )
+        except (ValueError, InvalidId):
+            return jsonify({"error": "Invalid pagination parameters"}), 400
+        
+        return jsonify({"comments": comments, "nextCursor": next_cursor}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # ---------------------------
 # Get Discussion Categories/Stats
 # ---------------------------
+CATEGORIES = ["Hygiene", "Privacy", "Urgent", "Suggestions", "Appreciation", "Feedback"]
+
+
+def discussion_stats_pipeline(since=None):
+    """
+    Single aggregation counting all discussions and the discussions carrying
+    each tag, plus per-tag counts for discussions created since `since`.
+    """
+    # Count a discussion once per tag even if the tag is repeated
+    unique_tags = {"$project": {"tags": {"$cond": [{"$isArray": "$tags"}, {"$setUnion": ["$tags", []]}, ["$tags"]]}}}
+    count_tags = [unique_tags, {"$unwind": "$tags"}, {"$group": {"_id": "$tags", "count": {"$sum": 1}}}]
+
+    facets = {
+        "total": [{"$count": "count"}],
+        "tags": count_tags,
+    }
+    if since is not None:
+        facets["trending"] = [{"$match": {"createdAt": {"$gte": since}}}] + count_tags
+    return [{"$facet": facets}]
+
+
+def tag_counts(rows):
+    """Map tag rows to display names; known categories keep their capitalised name."""
+    names = {category.lower(): category for category in CATEGORIES}
+    return {names.get(row['_id'], row['_id']): row['count'] for row in rows if row['_id'] is not None}
+
+
+def discussion_stats(result):
+    """Stats response body for the document returned by discussion_stats_pipeline."""
+    stats = {"All Posts": result['total'][0]['count'] if result['total'] else 0}
+    stats.update(dict.fromkeys(CATEGORIES, 0))
+    stats.update(tag_counts(result['tags']))
+    if 'trending' in result:
+        stats['trending'] = tag_counts(result['trending'])
+    return stats
+
+
 @discussion_bp.route('/api/discussions/stats', methods=['GET'])
+@cache.cached('discussions', timeout=600)
 def get_discussion_stats():
+    """
+    Discussion count for "All Posts" and for every tag in use. With
+    `?days=N` the response also has a "trending" object with per-tag counts
+    of discussions created in the last N days.
+    """
     try:
-        # Get count for each category
-        categories = ["All Posts", "Hygiene", "Privacy", "Urgent", "Suggestions", "Appreciation", "Feedback"]
-        stats = {}
-        
-        for category in categories:
-            if category == "All Posts":
-                count = mongo.db.discussions.count_documents({})
-            else:
-                count = mongo.db.discussions.count_documents({"tags": category.lower()})
-            stats[category] = count
-        
-        return jsonify(stats), 200
+        days = request.args.get('days', type=int)
+        since = datetime.utcnow() - timedelta(days=days) if days else None
+
+        result = next(mongo.db.discussions.aggregate(discussion_stats_pipeline(since)))
+        return jsonify(discussion_stats(result)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-
@@ -0,0 +1,72 @@
+from flask import Blueprint, request, jsonify
+from app.extensions import mongo
+from app import facilities
+from app.auth import admin_required
+from pymongo.errors import DuplicateKeyError
+
+facility_bp = Blueprint('facilities', __name__)
+
+# ---------------------------
+# List Facilities
+# ---------------------------
+@facility_bp.route('/api/facilities', methods=['GET'])
+def get_facilities():
+    """Every registered facility, optionally filtered by `building` and `floor`."""
+    try:
+        building = request.args.get('building')
+        floor = request.args.get('floor')
+        result = [
+            facilities.public(facility) for facility in facilities.registry.all()
+            if (not building or facility.get('building') == building)
+            and (not floor or str(facility.get('floor')) == floor)
+        ]
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ---------------------------
+# Get Facility
+# ---------------------------
+@facility_bp.route('/api/facilities/<int:facility_id>', methods=['GET'])
+def get_facility(facility_id):
+    try:
+        facility = facilities.registry.get(facility_id)
+        if not facility:
+            return jsonify({"message": "Facility not found"}), 404
+        return jsonify(facilities.public(facility)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ---------------------------
+# Register Facility (admin)
+# ---------------------------
+@facility_bp.route('/api/facilities', methods=['POST'])
+@admin_required
+def create_facility():
+    """
+    Register a facility: `name` (the location name reports use), and
+    optionally `building`, `floor` and `room`; floor and room default to
+    the room number in the name.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        name = data.get('name')
+        if not isinstance(name, str) or not name.strip():
+            return jsonify({"message": "name is required"}), 400
+        floor = data.get('floor')
+        if floor is not None and (not isinstance(floor, int) or isinstance(floor, bool)):
+            return jsonify({"message": "floor must be an integer"}), 400
+
+        try:
+            facility = facilities.create(
+                mongo.db, name.strip(),
+                building=data.get('building') or facilities.DEFAULT_BUILDING,
+                floor=floor,
+                room=data.get('room'),
+            )
+        except DuplicateKeyError:
+            return jsonify({"message": "A facility with this name or room already exists"}), 409
+        facilities.registry.invalidate()
+        return jsonify(facilities.public(facility)), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
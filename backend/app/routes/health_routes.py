@@ -0,0 +1,32 @@
+from flask import Blueprint, jsonify, current_app
+from app.extensions import mongo, pool_monitor, resilience
+from pymongo.errors import PyMongoError
+import time
+
+health_bp = Blueprint('health', __name__)
+
+# ---------------------------
+# Liveness: the process is serving requests
+# ---------------------------
+@health_bp.route('/api/health/live', methods=['GET'])
+def live():
+    return jsonify({"status": "ok"}), 200
+
+# ---------------------------
+# Readiness: MongoDB is reachable and this worker's pool is warm
+# ---------------------------
+@health_bp.route('/api/health/ready', methods=['GET'])
+def ready():
+    try:
+        started = time.perf_counter()
+        mongo.cx.admin.command('ping')
+        ping_ms = round((time.perf_counter() - started) * 1000, 2)
+    except PyMongoError as e:
+        return jsonify({"status": "unavailable", "error": f"MongoDB unreachable: {e}"}), 503
+
+    connections = pool_monitor.ready_connections
+    warm = connections >= current_app.config['MONGO_MIN_POOL_SIZE']
+    return jsonify({
+        "status": "ready" if warm else "warming",
+        "mongo": {"pingMs": ping_ms, "connections": connections, "breaker": resilience.breaker.state},
+    }), 200 if warm else 503
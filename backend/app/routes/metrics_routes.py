@@ -0,0 +1,23 @@
+import hmac
+from flask import Blueprint, Response, abort, current_app, request
+from app.extensions import metrics, pool_monitor, resilience
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# ---------------------------
+# Prometheus scrape endpoint
+# ---------------------------
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    token = current_app.config['METRICS_TOKEN']
+    # Not served at all until a token is configured or it is made public on purpose
+    if not metrics.enabled or not (token or current_app.config['METRICS_PUBLIC']):
+        abort(404)
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+
+    body = metrics.render(gauges=[
+        ("mongodb_pool_ready_connections", "Open connections in this worker's pool.", pool_monitor.ready_connections),
+        ("mongodb_circuit_breaker_open", "1 while read endpoints are not querying MongoDB.", int(resilience.breaker.state != "closed")),
+    ])
+    return Response(body, mimetype="text/plain; version=0.0.4")
@@ -101,79 +101,216 @@
 
 
 from flask import Blueprint, request, jsonify
-from app.extensions import mongo
+from app.extensions import mongo, ingest, resilience
+from app import report_hooks, report_status, report_store
+from app.json_provider import json_list_response
+from app.ingest import QueueFull
+from app.pagination import after_cursor, encode_cursor
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from datetime import datetime
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import PyMongoError
 
 report_bp = Blueprint('reports', __name__)
 
 # ---------------------------
 # Submit Report
 # ---------------------------
+def submitter_email():
+    """Email of the submitter if the request carries a valid token, else "anonymous"."""
+    # Try to get identity from JWT if available, but don't require it
+    # Submissions work with or without authentication - NEVER FAIL due to JWT
+    email = "anonymous"
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header and auth_header.startswith('Bearer '):
+        try:
+            # Try to verify and get identity, but catch ALL exceptions
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+            if identity and isinstance(identity, dict):
+                email = identity.get('email', 'anonymous')
+        except Exception:
+            # Completely ignore JWT errors - allow anonymous submission
+            email = "anonymous"
+    return email
+
+
 @report_bp.route('/api/reports', methods=['POST'])
 def submit_report():
     try:
         data = request.get_json()
         if not data:
             return jsonify({"message": "Request body is required"}), 400
-        
-        required_fields = ['issueType', 'location', 'priority']
 
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({"message": f"{field} is required"}), 400
+        error = report_store.validate(data)
+        if error:
+            return jsonify({"message": error}), 400
 
-        # Try to get identity from JWT if available, but don't require it
-        # This endpoint works with or without authentication - NEVER FAILS due to JWT
-        email = "anonymous"
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header and auth_header.startswith('Bearer '):
+        report = report_store.build_report(data, submitter_email())
+        if ingest.enabled:
             try:
-                # Try to verify and get identity, but catch ALL exceptions
-                from flask_jwt_extended.exceptions import JWTDecodeError, InvalidHeaderError
-                verify_jwt_in_request(optional=True)
-                identity = get_jwt_identity()
-                if identity and isinstance(identity, dict):
-                    email = identity.get('email', 'anonymous')
-            except (JWTDecodeError, InvalidHeaderError, Exception) as e:
-                # Completely ignore JWT errors - allow anonymous submission
-                # This ensures the endpoint ALWAYS works
-                email = "anonymous"
-
-        report = {
-            "issueType": data['issueType'],
-            "location": data['location'],
-            "priority": data['priority'],
-            "details": data.get('details', ''),
-            "timestamp": datetime.utcnow(),
-            "userEmail": email,
-            "status": "pending"
-        }
-
-        mongo.db.reports.insert_one(report)
-        return jsonify({"message": "Report submitted successfully!"}), 201
+                tracking_id = ingest.submit(report)
+            except QueueFull:
+                response = jsonify({"message": "Too many reports right now, please retry shortly"})
+                response.headers['Retry-After'] = '1'
+                return response, 503
+            response = jsonify({"message": "Report received", "trackingId": tracking_id})
+            response.headers['Location'] = f"/api/reports/ingest/{tracking_id}"
+            return response, 202
+
+        result = report_store.insert_report(report)
+        if result['status'] == "error":
+            return jsonify({"error": result['error']}), 500
+        if result['status'] == "duplicate":
+            return jsonify({"message": "Report already submitted", "id": result['id']}), 200
+        if result['status'] == "merged":
+            return jsonify({"message": "Report added to an open incident", "id": result['id'], "merged": True}), 201
+        return jsonify({"message": "Report submitted successfully!", "id": result['id']}), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ---------------------------
+# Status of a queued submission (INGEST_MODE=queue)
+# ---------------------------
+@report_bp.route('/api/reports/ingest/<tracking_id>', methods=['GET'])
+def get_ingest_status(tracking_id):
+    try:
+        report = mongo.db.reports.find_one({"idempotencyKeys": tracking_id}, {"_id": 1})
+        if report:
+            return jsonify({"trackingId": tracking_id, "status": "stored", "id": report['_id']}), 200
+        if ingest.is_pending(tracking_id):
+            return jsonify({"trackingId": tracking_id, "status": "queued"}), 200
+        # Queued by another worker, rejected, or unknown
+        return jsonify({"trackingId": tracking_id, "status": "unknown"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ---------------------------
+# Submit Reports in Bulk (kiosks replaying offline queues)
+# ---------------------------
+MAX_BULK_REPORTS = 500
+
+
+@report_bp.route('/api/reports/bulk', methods=['POST'])
+def submit_reports_bulk():
+    """
+    Insert up to MAX_BULK_REPORTS reports, sent as a JSON array or as
+    {"reports": [...]}. Every item gets a result in request order; items
+    whose idempotencyKey was already stored come back as "duplicate" with
+    the stored id, and items merged into an open incident as "merged" with
+    the incident's id. 201 when no item failed, 207 otherwise.
+    """
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('reports') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({"message": "A non-empty array of reports is required"}), 400
+        if len(items) > MAX_BULK_REPORTS:
+            return jsonify({"message": f"At most {MAX_BULK_REPORTS} reports per request"}), 413
+
+        email = submitter_email()
+        now = datetime.utcnow()
+        results = [None] * len(items)
+        valid, positions = [], []
+        for index, item in enumerate(items):
+            error = report_store.validate(item)
+            if error:
+                results[index] = {"index": index, "status": "invalid", "id": None, "error": error}
+            else:
+                valid.append(report_store.build_report(item, email, now))
+                positions.append(index)
+
+        for index, result in zip(positions, report_store.insert_reports(valid)):
+            results[index] = {"index": index, **result}
+
+        counts = {status: sum(1 for r in results if r['status'] == status) for status in ("created", "merged", "duplicate")}
+        failed = len(results) - sum(counts.values())
+        return jsonify({
+            "results": results,
+            "created": counts["created"],
+            "merged": counts["merged"],
+            "duplicates": counts["duplicate"],
+            "failed": failed,
+        }), 207 if failed else 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # ---------------------------
 # Get All Reports
 # ---------------------------
+REPORT_FIELDS = ['issueType', 'location', 'priority', 'details', 'timestamp', 'status', 'resolvedAt', 'confirmedAt', 'reportCount', 'lastReportedAt', 'facilityId']
+MAX_PAGE_SIZE = 500
+
+
+def reports_query(args):
+    """
+    Build (filter, projection, limit) for GET /api/reports from the query
+    string. Raises ValueError or InvalidId on malformed parameters.
+    """
+    query = {}
+    for field in ('status', 'location', 'priority'):
+        value = args.get(field)
+        if value:
+            values = value.split(',')
+            query[field] = values[0] if len(values) == 1 else {"$in": values}
+    # Confirmed reports are closed; they are only listed when asked for
+    facility_ids = args.get('facilityId')
+    if facility_ids:
+        values = [int(v) for v in facility_ids.split(',')]
+        query['facilityId'] = values[0] if len(values) == 1 else {"$in": values}
+    query.setdefault('status', {"$in": report_status.OPEN_STATUSES})
+
+    after = args.get('after')
+    if after:
+        query.update(after_cursor('timestamp', after))
+
+    projection = report_status.PRIVATE_PROJECTION
+    fields = args.get('fields')
+    if fields:
+        requested = [f for f in fields.split(',') if f in REPORT_FIELDS]
+        # timestamp is always needed to build the next cursor
+        projection = dict.fromkeys(set(requested) | {'timestamp'}, 1)
+
+    limit = args.get('limit')
+    if limit is not None:
+        limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+    elif after:
+        limit = MAX_PAGE_SIZE
+
+    return query, projection, limit
+
+
 @report_bp.route('/api/reports', methods=['GET'])
+@resilience.degradable()
 def get_all_reports():
+    """
+    Reports newest first. Supports `status`, `location`, `priority` and
+    `facilityId` filters (comma separated; confirmed reports are left out unless `status`
+    asks for them), `fields` projection and keyset pagination via
+    `limit`/`after`; the cursor for the next page is sent in X-Next-Cursor.
+    Without `limit` or `after` every matching report is returned.
+    """
     try:
-        reports = list(mongo.db.reports.find().sort("timestamp", -1))
-        for report in reports:
-            report['_id'] = str(report['_id'])
-            # Handle datetime serialization
-            if 'timestamp' in report:
-                if hasattr(report['timestamp'], 'isoformat'):
-                    report['timestamp'] = report['timestamp'].isoformat()
-                elif isinstance(report['timestamp'], dict) and '$date' in report['timestamp']:
-                    # Handle MongoDB extended JSON format
-                    from datetime import datetime
-                    report['timestamp'] = datetime.fromtimestamp(report['timestamp']['$date'] / 1000).isoformat()
-        return jsonify(reports), 200
+        try:
+            query, projection, limit = reports_query(request.args)
+        except (ValueError, InvalidId):
+            return jsonify({"error": "Invalid pagination parameters"}), 400
+
+        cursor = mongo.db.reports.find(query, projection).sort([("timestamp", -1), ("_id", -1)])
+        if not limit:
+            return json_list_response(cursor), 200
+
+        reports = list(cursor.limit(limit))
+        response = jsonify(reports)
+        if len(reports) == limit:
+            next_cursor = encode_cursor(reports[-1].get('timestamp'), reports[-1]['_id'])
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
+    except PyMongoError:
+        # Served stale or as 503 by @resilience.degradable
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -198,36 +335,33 @@ def get_my_reports():
         if not email:
             return jsonify({"error": "Email not found in token"}), 401
         
-        reports = list(mongo.db.reports.find({"userEmail": email}).sort("timestamp", -1))
-        for report in reports:
-            report['_id'] = str(report['_id'])
-            # Handle datetime serialization
-            if 'timestamp' in report and hasattr(report['timestamp'], 'isoformat'):
-                report['timestamp'] = report['timestamp'].isoformat()
-        return jsonify(reports), 200
+        reports = mongo.db.reports.find(
+            {"reporterEmails": email, "status": {"$in": report_status.OPEN_STATUSES}},
+            report_status.PRIVATE_PROJECTION
+        ).sort("timestamp", -1)
+        return json_list_response(reports), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # ---------------------------
-# PATCH: Resolve a report (Admin side - moves to admin_updates)
+# POST: Resolve a report (Admin side - pending -> resolved_by_admin)
 # ---------------------------
 @report_bp.route('/api/reports/<report_id>/resolve', methods=['POST'])
 def resolve_report(report_id):
-    report = mongo.db.reports.find_one({'_id': ObjectId(report_id)})
+    try:
+        report_id = ObjectId(report_id)
+    except InvalidId:
+        return jsonify({"message": "Invalid report id"}), 400
 
+    report, changed = report_status.advance(report_id, report_status.RESOLVED_BY_ADMIN)
     if not report:
         return jsonify({"message": "Report not found"}), 404
+    if changed:
+        report_hooks.report_resolved(report)
+    elif report['status'] != report_status.RESOLVED_BY_ADMIN:
+        return jsonify({"message": f"Report is {report['status']}, not pending"}), 409
 
-    # Insert into admin_updates collection
-    mongo.db.admin_updates.insert_one({
-        "reportId": str(report['_id']),
-        "issueType": report.get('issueType', ''),
-        "location": report.get('location', ''),
-        "priority": report.get('priority', ''),
-        "timestamp": datetime.utcnow()
-    })
-
-    # Do NOT delete from 'reports' collection here. It will be deleted on user confirmation.
+    # The report stays in 'reports' until its user confirms the resolution
     return jsonify({"message": "Report moved to admin updates for user confirmation"}), 200
 
 # ---------------------------
@@ -235,8 +369,9 @@ def resolve_report(report_id):
 # ---------------------------
 @report_bp.route('/api/reports/<report_id>', methods=['DELETE'])
 def delete_report(report_id):
-    result = mongo.db.reports.delete_one({'_id': ObjectId(report_id)})
-    if result.deleted_count == 1:
+    report = mongo.db.reports.find_one_and_delete({'_id': ObjectId(report_id)})
+    if report:
+        report_hooks.report_deleted(report)
         return jsonify({"message": "Report deleted successfully"}), 200
     return jsonify({"message": "Report not found"}), 404
 
@@ -245,7 +380,5 @@ def delete_report(report_id):
 # ---------------------------
 @report_bp.route('/api/admin-updates', methods=['GET'])
 def get_admin_updates():
-    updates = list(mongo.db.admin_updates.find().sort("timestamp", -1))
-    for update in updates:
-        update['_id'] = str(update['_id'])
-    return jsonify(updates), 200
\ No newline at end of file
+    updates = mongo.db.reports.aggregate(report_status.admin_updates_pipeline())
+    return json_list_response(updates), 200
\ No newline at end of file
@@ -0,0 +1,35 @@
+from flask import Blueprint, Response, request, current_app
+from app.extensions import mongo, events
+
+stream_bp = Blueprint('stream', __name__)
+
+# ---------------------------
+# Live Events (Server-Sent Events)
+# ---------------------------
+@stream_bp.route('/api/stream', methods=['GET'])
+def stream():
+    """
+    Server-sent events: report-created, report-merged, report-resolved,
+    resolution-confirmed, report-deleted and location-status-changed.
+    Reconnecting clients resume from their Last-Event-ID; a "resync" event
+    means events were missed (or the client reconnected to another worker)
+    and the client should refetch.
+    """
+    events.ensure_watcher(mongo.db)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield "retry: 3000\n\n"
+        for event in events.listen(last_event_id):
+            if event is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            event_id, event_type, data = event
+            yield f"id: {event_id}\nevent: {event_type}\ndata: {dumps(data)}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,82 @@
+"""
+$jsonSchema validators that keep stored documents in their canonical BSON
+types: dates as BSON dates and references as ObjectIds. Legacy documents
+are rewritten by the migrations in `app.migrations` before the validators
+are applied.
+
+Validation is "moderate": inserts and updates of valid documents are
+checked, and a document that is still invalid can be updated without
+first fixing every field.
+"""
+from pymongo.errors import CollectionInvalid
+from app.report_status import PENDING, RESOLVED_BY_ADMIN, CONFIRMED
+
+VALIDATORS = {
+    "reports": {
+        "bsonType": "object",
+        "required": ["issueType", "location", "priority", "timestamp", "status"],
+        "properties": {
+            "issueType": {"bsonType": "string"},
+            "location": {"bsonType": "string"},
+            "priority": {"bsonType": "string"},
+            "details": {"bsonType": "string"},
+            "userEmail": {"bsonType": "string"},
+            "reporterEmails": {"bsonType": "array", "items": {"bsonType": "string"}},
+            "timestamp": {"bsonType": "date"},
+            "status": {"enum": [PENDING, RESOLVED_BY_ADMIN, CONFIRMED]},
+            "resolvedAt": {"bsonType": "date"},
+            "confirmedAt": {"bsonType": "date"},
+            "idempotencyKeys": {"bsonType": "array", "items": {"bsonType": "string", "maxLength": 128}},
+            "clusterKey": {"bsonType": "string"},
+            "reportCount": {"bsonType": ["int", "long"], "minimum": 1},
+            "lastReportedAt": {"bsonType": "date"},
+            "facilityId": {"bsonType": ["int", "long"]},
+        },
+    },
+    "discussions": {
+        "bsonType": "object",
+        "required": ["title", "createdAt"],
+        "properties": {
+            "title": {"bsonType": "string"},
+            "tags": {"bsonType": "array"},
+            "createdAt": {"bsonType": "date"},
+            "commentCount": {"bsonType": ["int", "long"], "minimum": 0},
+        },
+    },
+    "facilities": {
+        "bsonType": "object",
+        "required": ["name", "building"],
+        "properties": {
+            "_id": {"bsonType": ["int", "long"]},
+            "name": {"bsonType": "string"},
+            "building": {"bsonType": "string"},
+            "floor": {"bsonType": ["int", "long", "null"]},
+            "room": {"bsonType": ["string", "null"]},
+        },
+    },
+    "comments": {
+        "bsonType": "object",
+        "required": ["discussionId", "createdAt"],
+        "properties": {
+            "discussionId": {"bsonType": "objectId"},
+            "text": {"bsonType": "string"},
+            "authorEmail": {"bsonType": "string"},
+            "createdAt": {"bsonType": "date"},
+        },
+    },
+}
+
+
+def apply_validators(db):
+    """Install (or replace) the validator of every collection in VALIDATORS."""
+    for collection, schema in VALIDATORS.items():
+        options = {
+            "validator": {"$jsonSchema": schema},
+            "validationLevel": "moderate",
+            "validationAction": "error",
+        }
+        try:
+            db.create_collection(collection, **options)
+        except CollectionInvalid:
+            # Already exists
+            db.command("collMod", collection, **options)
@@ -0,0 +1,159 @@
+"""
+Request coalescing ("single flight") for expensive reads.
+
+    entry = flight.do(key, compute)
+
+runs `compute` once for every concurrent caller with the same `key`: the
+first caller computes, later callers wait and get the same result (or the
+same exception). Nothing is kept once the call finishes; caching stays the
+job of ResponseCache, which routes its misses through here so a burst of
+identical requests costs one computation even with CACHE_BACKEND=none or
+right after an invalidation.
+
+With SINGLE_FLIGHT_LOCK_DIR set, calls are also coalesced across the
+worker processes of one machine: the computing worker holds an flock on a
+per-key lock file and leaves the result next to it (pickled), and workers
+that waited for the lock read it instead of computing again. Needs
+`fcntl`, so it is in-process only on Windows.
+"""
+import glob
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no forking server to coalesce across
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Lock and result files untouched for this long are removed
+STALE_FILE_SECONDS = 60
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self, lock_dir=None, timeout=30):
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._cleaned = 0.0
+
+    def do(self, key, compute):
+        """Result of `compute()`, shared with every concurrent call for `key`."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                # The computing request is stuck; do not queue behind it forever
+                return compute()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.lock_dir and fcntl is not None:
+                call.result = self._across_processes(key, compute)
+            else:
+                call.result = compute()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    # ---------------------------
+    # Across processes
+    # ---------------------------
+    def _across_processes(self, key, compute):
+        name = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        lock_path = os.path.join(self.lock_dir, f"{name}.lock")
+        result_path = os.path.join(self.lock_dir, f"{name}.result")
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+        started = time.time()
+        with open(lock_path, "a") as lock:
+            waited = not self._acquire(lock)
+            try:
+                if waited:
+                    shared = self._read_result(result_path, key, started)
+                    if shared is not None:
+                        return shared[0]
+                result = compute()
+                self._write_result(result_path, key, result)
+                return result
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                self._clean()
+
+    def _acquire(self, lock):
+        """Take the flock. True if it was free, False if another process held it first."""
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.utime(lock.name)
+            return True
+        except BlockingIOError:
+            pass
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.01)
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.utime(lock.name)
+                return False
+            except BlockingIOError:
+                continue
+        # Whoever holds it is stuck: compute without it rather than wait more
+        return False
+
+    def _read_result(self, path, key, since):
+        """(result,) left by the process we waited for, or None."""
+        try:
+            if os.path.getmtime(path) < since:
+                return None
+            with open(path, "rb") as f:
+                stored_key, result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        return (result,) if stored_key == key else None
+
+    def _write_result(self, path, key, result):
+        try:
+            temporary = f"{path}.{os.getpid()}"
+            with open(temporary, "wb") as f:
+                pickle.dump((key, result), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning("Could not share a single-flight result: %s", e)
+
+    def _clean(self):
+        now = time.time()
+        if now - self._cleaned < STALE_FILE_SECONDS:
+            return
+        self._cleaned = now
+        for path in glob.glob(os.path.join(self.lock_dir, "*.lock")) + glob.glob(os.path.join(self.lock_dir, "*.result")):
+            try:
+                if now - os.path.getmtime(path) > STALE_FILE_SECONDS:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,261 @@
+"""
+Slow query log: finds and aggregates that took longer than SLOW_QUERY_MS.
+
+`SlowQueryLog` is a pymongo CommandListener. For every slow find or
+aggregate it records the route that issued it and the shape of the query
+with every value replaced by "?", then (with SLOW_QUERY_EXPLAIN) runs the
+same command again under `explain` with "executionStats" on a background
+thread and adds a summary of the plan: the stages of the winning plan,
+keys and documents examined, and whether it scanned the whole collection.
+
+Entries are kept in memory for GET /api/admin/diagnostics/slow-queries and,
+with SLOW_QUERY_LOG_FILE set, appended to a rotating file as JSON lines.
+Off unless SLOW_QUERY_MS is set.
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+import pymongo
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from app.async_db import current_route
+
+logger = logging.getLogger(__name__)
+file_logger = logging.getLogger(__name__ + ".file")
+file_logger.propagate = False
+
+COMMANDS = ("find", "aggregate")
+# Find options copied into the explained command
+FIND_OPTIONS = ("filter", "sort", "projection", "hint", "skip", "limit", "collation")
+# Aggregation stages kept as they are: their arguments are not user data
+PLAIN_STAGES = ("$sort", "$limit", "$skip", "$count", "$unwind")
+# explain cannot run these with executionStats
+WRITE_STAGES = ("$out", "$merge")
+
+# Commands awaiting their reply, and explains waiting for the background thread
+MAX_PENDING = 1000
+EXPLAIN_QUEUE_SIZE = 100
+# The same query shape is explained at most once in this many seconds
+EXPLAIN_INTERVAL_SECONDS = 300
+EXPLAIN_TIMEOUT_SECONDS = 10
+
+
+def redact(value):
+    """`value` with every literal replaced by "?"; operators, field names and $field paths are kept."""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(item, (dict, list, tuple)) for item in value):
+            return [redact(item) for item in value]
+        # Lists of literals ($in, ...) collapse, so their length is not kept either
+        return ["?"] if value else []
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+
+def redact_pipeline(pipeline):
+    return [
+        stage if next(iter(stage), None) in PLAIN_STAGES else redact(stage)
+        for stage in pipeline
+    ]
+
+
+def _plan_stages(plan):
+    """Stage names of a query plan, outermost first."""
+    stages = []
+    while plan:
+        stages.append(plan.get("stage"))
+        children = plan.get("inputStages") or []
+        for child in children[1:]:
+            stages.extend(_plan_stages(child))
+        plan = plan.get("inputStage") or (children[0] if children else None)
+    return stages
+
+
+def summarize(explain):
+    """The parts of an explain("executionStats") result worth logging."""
+    # Pipelines that start with a query explain it under their first stage
+    source = explain
+    if "queryPlanner" not in explain and explain.get("stages"):
+        source = explain["stages"][0].get("$cursor", {})
+    planner = source.get("queryPlanner", {})
+    stats = source.get("executionStats", {})
+    winning = planner.get("winningPlan", {})
+    stages = _plan_stages(winning.get("queryPlan", winning))
+    return {
+        "stages": stages,
+        "collectionScan": "COLLSCAN" in stages,
+        "nReturned": stats.get("nReturned"),
+        "keysExamined": stats.get("totalKeysExamined"),
+        "docsExamined": stats.get("totalDocsExamined"),
+        "executionTimeMillis": stats.get("executionTimeMillis"),
+    }
+
+
+def _explainable(command_name, command):
+    """The command to run under explain, or None for ones that should not be re-run."""
+    if command_name == "find":
+        explained = {"find": command["find"]}
+        explained.update({option: command[option] for option in FIND_OPTIONS if option in command})
+        return explained
+    pipeline = command.get("pipeline") or []
+    if not isinstance(command.get("aggregate"), str) or any(next(iter(stage), None) in WRITE_STAGES for stage in pipeline):
+        return None
+    return {"aggregate": command["aggregate"], "pipeline": pipeline, "cursor": {}}
+
+
+class SlowQueryLog(monitoring.CommandListener):
+
+    def __init__(self):
+        self.threshold_ms = 0
+        self.explain = True
+        self._entries = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._explained = {}
+        self._queue = None
+        self._pid = None
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    def init_app(self, app):
+        self.threshold_ms = app.config.get('SLOW_QUERY_MS', 0)
+        self.explain = app.config.get('SLOW_QUERY_EXPLAIN', True)
+        self._entries = deque(maxlen=app.config.get('SLOW_QUERY_KEEP', 200))
+        path = app.config.get('SLOW_QUERY_LOG_FILE', '')
+        if self.enabled and path and not file_logger.handlers:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            handler = RotatingFileHandler(
+                path,
+                maxBytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+                backupCount=app.config.get('SLOW_QUERY_LOG_BACKUPS', 5),
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            file_logger.addHandler(handler)
+            file_logger.setLevel(logging.INFO)
+
+    def entries(self, limit=None):
+        """Recorded slow queries, newest first."""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    # ---------------------------
+    # Command monitoring
+    # ---------------------------
+    def started(self, event):
+        if self.threshold_ms <= 0 or event.command_name not in COMMANDS:
+            return
+        if len(self._pending) >= MAX_PENDING:
+            self._pending.clear()
+        # Also set for queries on async_mongo's loop thread
+        route = current_route()
+        self._pending[(event.connection_id, event.request_id)] = (event.database_name, event.command, route)
+
+    def succeeded(self, event):
+        self._finished(event, None)
+
+    def failed(self, event):
+        self._finished(event, event.failure)
+
+    def _finished(self, event, failure):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+        database, command, route = pending
+        entry = {
+            "id": next(self._ids),
+            "at": datetime.utcnow().isoformat() + "Z",
+            "route": route,
+            "database": database,
+            "collection": command.get(event.command_name),
+            "command": event.command_name,
+            "durationMs": round(duration_ms, 1),
+            # Filled in by the explain thread; present from the start so the dict never grows while listed
+            "plan": None,
+        }
+        if event.command_name == "find":
+            entry["filter"] = redact(command.get("filter", {}))
+            if "sort" in command:
+                entry["sort"] = dict(command["sort"])
+        else:
+            entry["pipeline"] = redact_pipeline(command.get("pipeline") or [])
+        if failure is not None:
+            entry["error"] = failure.get("errmsg") if isinstance(failure, dict) else str(failure)
+        else:
+            cursor = event.reply.get("cursor") or {}
+            entry["docsReturned"] = len(cursor.get("firstBatch") or ())
+
+        with self._lock:
+            self._entries.append(entry)
+        explained = _explainable(event.command_name, command) if self.explain else None
+        if explained is None or not self._submit(entry, database, explained):
+            self._write(entry)
+
+    # ---------------------------
+    # Explain
+    # ---------------------------
+    def _submit(self, entry, database, command):
+        """Queue an explain for `entry`. False if it will not run (recently explained or queue full)."""
+        shape = json.dumps([entry["collection"], entry.get("filter"), entry.get("sort"), entry.get("pipeline")], default=str)
+        now = time.monotonic()
+        if now - self._explained.get(shape, -EXPLAIN_INTERVAL_SECONDS) < EXPLAIN_INTERVAL_SECONDS:
+            return False
+        self._explained[shape] = now
+        if len(self._explained) > MAX_PENDING:
+            self._explained.clear()
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((entry, database, command))
+            return True
+        except queue.Full:
+            return False
+
+    def _ensure_started(self):
+        # The thread does not survive a fork: every worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(EXPLAIN_QUEUE_SIZE)
+            threading.Thread(target=self._run, name="slow-query-explain", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        from app.extensions import mongo
+
+        while True:
+            entry, database, command = self._queue.get()
+            try:
+                with pymongo.timeout(EXPLAIN_TIMEOUT_SECONDS):
+                    explain = mongo.cx[database].command({"explain": command, "verbosity": "executionStats"})
+                entry["plan"] = summarize(explain)
+            except PyMongoError as e:
+                entry["plan"] = {"error": str(e)}
+            except Exception:
+                logger.exception("Could not explain slow query %s", entry["id"])
+            self._write(entry)
+
+    def _write(self, entry):
+        logger.warning(
+            "Slow %s on %s from %s: %sms", entry["command"], entry["collection"], entry["route"] or "no request",
+            entry["durationMs"]
+        )
+        if file_logger.handlers:
+            file_logger.info(json.dumps(entry, default=str))
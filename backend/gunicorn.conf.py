@@ -0,0 +1,60 @@
+"""
+Gunicorn settings for the backend. Every value can be overridden from the
+environment, e.g. `WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py wsgi:app`.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# Processes; the usual 2 x cores + 1
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Read by the app (preloaded after this file), e.g. to cap per-worker cache lifetimes
+os.environ["WEB_WORKERS"] = str(workers)
+
+# Threads per process. Each open /api/stream connection holds one thread
+# for as long as the client stays connected, so keep this above the number
+# of dashboards a worker is expected to serve.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Seconds an idle keep-alive connection is held open; set above the
+# timeout of the load balancer in front so it closes connections first
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Import the app once in the master so workers fork with it loaded
+preload_app = True
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    # The master never serves requests; drop the client create_app made
+    # (ensuring indexes) so its sockets are not inherited by the workers
+    from app.extensions import mongo
+    if mongo.cx is not None:
+        mongo.cx.close()
+
+
+def post_fork(server, worker):
+    # MongoClient is not fork-safe: every worker opens its own pool
+    from wsgi import app
+    from app import init_mongo
+    from app.extensions import ingest
+    init_mongo(app)
+    # Replays reports queued by workers that died before storing them
+    ingest.start()
+
+
+def worker_exit(server, worker):
+    # Store reports still queued by INGEST_MODE=queue before the worker goes
+    from app.extensions import ingest
+    ingest.drain()
@@ -1,8 +1,10 @@
 from app import create_app
 from dotenv import load_dotenv
+import os
 
 load_dotenv()
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Development server only; production runs wsgi.py under gunicorn
+    app.run(debug=os.getenv("FLASK_DEBUG", "true").lower() == "true")
@@ -0,0 +1,8 @@
+"""
+Production entry point: `gunicorn -c gunicorn.conf.py wsgi:app`.
+"""
+from dotenv import load_dotenv
+from app import create_app
+
+load_dotenv()
+app = create_app()
@@ -141,48 +141,51 @@ const AdminDashboard = () => {
 
   // Fetch data from backend
   useEffect(() => {
-    fetchDashboardData();
-    fetchAdminUpdates();
+    fetchDashboard();
   }, []);
 
-  const fetchDashboardData = async () => {
+  // Loads the reports, admin updates and stats in one request
+  const fetchDashboard = async () => {
     try {
-      // Fetch reports from MongoDB
-      const reportsResponse = await fetch("http://localhost:5000/api/reports");
-      const reportsData = await reportsResponse.json();
-
-      // Transform the reports data to match our UI structure
-      const transformedIssues = reportsData.map((report) => ({
-        _id: report._id,
-        type: report.issueType,
-        priority: report.priority || "MEDIUM",
-        title: report.details,
-        location: report.location,
-        time: new Date(report.timestamp).toLocaleString(),
-        status: report.status || "pending",
-        reportedBy: report.reportedBy || "Anonymous",
-      }));
-
-      setLiveIssues(transformedIssues);
-
-      // Update dashboard stats
-      setDashboardStats({
-        activeIssues: transformedIssues.filter(
-          (issue) => issue.status === "pending"
-        ).length,
-        resolvedToday: transformedIssues.filter((issue) => {
-          const today = new Date().toDateString();
-          const issueDate = new Date(issue.time).toDateString();
-          return issue.status === "resolved" && issueDate === today;
-        }).length,
-        resolvedTrendPercentage: 15, // You can calculate this based on historical data
+      const response = await axios.get("http://localhost:5000/api/dashboard/admin", {
+        params: { sections: "reports,adminUpdates,stats" },
       });
+      const sections = response.data;
+      applyReports((sections.reports && sections.reports.data) || []);
+      setAdminUpdates((sections.adminUpdates && sections.adminUpdates.data) || []);
+      if (sections.stats && sections.stats.data) {
+        applyStats(sections.stats.data);
+      }
     } catch (error) {
-      console.error("Error fetching dashboard data:", error);
-      // Implement error handling/notification
+      console.error("Error fetching dashboard:", error);
     }
   };
 
+  const applyReports = (reportsData) => {
+    // Transform the reports data to match our UI structure
+    const transformedIssues = reportsData.map((report) => ({
+      _id: report._id,
+      type: report.issueType,
+      priority: report.priority || "MEDIUM",
+      title: report.details,
+      location: report.location,
+      time: new Date(report.timestamp).toLocaleString(),
+      status: report.status || "pending",
+      reportedBy: report.reportedBy || "Anonymous",
+    }));
+
+    setLiveIssues(transformedIssues);
+  };
+
+  // Counts come from the server's report rollups, not the loaded reports
+  const applyStats = (stats) => {
+    setDashboardStats({
+      activeIssues: stats.activeIssues,
+      resolvedToday: stats.resolvedToday,
+      resolvedTrendPercentage: stats.resolutionRate,
+    });
+  };
+
   const fetchAdminUpdates = async () => {
     try {
       const response = await axios.get("http://localhost:5000/api/admin/updates");
@@ -129,8 +129,9 @@ const ReportForm = () => {
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState("");
   const [formVisible, setFormVisible] = useState(false);
+  const [facilities, setFacilities] = useState([]);
 
-  const locations = [
+  const defaultLocations = [
     "Restroom - Ground Floor(010)",
     "Restroom - First Floor(110)",
     "Restroom - Second Floor(210)",
@@ -139,6 +140,9 @@ const ReportForm = () => {
     "Restroom - Fifth Floor(510)",
     "Restroom - Sixth Floor(610)",
   ];
+  const locations = facilities.length
+    ? facilities.map((facility) => facility.name)
+    : defaultLocations;
 
   // Priority mapping based on issue type
   const priorityMapping = {
@@ -158,6 +162,12 @@ const ReportForm = () => {
       setLocation(prefilledLocation);
     }
     setFormVisible(true);
+
+    // Registered facilities; the default list is kept if this fails
+    fetch("http://localhost:5000/api/facilities")
+      .then((response) => (response.ok ? response.json() : []))
+      .then(setFacilities)
+      .catch(() => {});
   }, []);
 
   // Auto-set priority when issue type changes
@@ -235,9 +245,11 @@ const ReportForm = () => {
       });
     }
 
+    const facility = facilities.find((f) => f.name === location);
     const reportData = {
       issueType: finalIssueType,
       location,
+      ...(facility && { facilityId: facility.id }),
       priority,
       details,
       timestamp: new Date().toISOString(),
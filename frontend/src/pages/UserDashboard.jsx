@@ -113,11 +113,7 @@ function UserDashboard() {
   };
 
   useEffect(() => {
-    fetchReports();
-    fetchResolvedReports();
-    fetchWashroomStatus();
-    fetchDiscussions();
-    fetchDiscussionStats();
+    fetchDashboard();
   }, [activeCategory]);
 
   useEffect(() => {
@@ -126,12 +122,52 @@ function UserDashboard() {
     }
   }, [activeCategory, activeTab]);
 
+  // Live updates pushed by the backend instead of re-fetching everything
+  useEffect(() => {
+    const source = new EventSource("http://localhost:5000/api/stream");
+    source.addEventListener("report-created", (event) => {
+      const report = JSON.parse(event.data);
+      setRecentReports((prev) => [report, ...prev].slice(0, 20));
+    });
+    source.addEventListener("report-resolved", (event) => {
+      const update = JSON.parse(event.data);
+      setAdminUpdates((prev) => [update, ...prev]);
+    });
+    const removeReport = (event) => {
+      const { reportId } = JSON.parse(event.data);
+      setRecentReports((prev) => prev.filter((report) => report._id !== reportId));
+      setAdminUpdates((prev) => prev.filter((update) => update.reportId !== reportId));
+    };
+    source.addEventListener("resolution-confirmed", removeReport);
+    source.addEventListener("report-deleted", removeReport);
+    source.addEventListener("location-status-changed", (event) => {
+      const washroom = JSON.parse(event.data);
+      setWashroomStatus((prev) =>
+        prev.some((w) => w.name === washroom.name)
+          ? prev.map((w) => (w.name === washroom.name ? washroom : w))
+          : [...prev, washroom]
+      );
+    });
+    // Events were missed (e.g. the server restarted): refetch everything
+    source.addEventListener("resync", () => {
+      fetchReports();
+      fetchResolvedReports();
+      fetchWashroomStatus();
+    });
+    return () => source.close();
+  }, []);
+
   const fetchReports = async () => {
     try {
       const headers = getAuthHeaders();
 
       // Fetch recent reports (no auth needed)
-      const recentRes = await axios.get("http://localhost:5000/api/reports");
+      const recentRes = await axios.get("http://localhost:5000/api/reports", {
+        params: {
+          limit: 20,
+          fields: "issueType,location,priority,details,timestamp",
+        },
+      });
       setRecentReports(recentRes.data);
 
       // Fetch my reports (requires token)
@@ -257,19 +293,45 @@ function UserDashboard() {
     }
   };
 
+  // Loads every section of the dashboard in one request
+  const fetchDashboard = async () => {
+    try {
+      const params = activeCategory === "All Posts" ? {} : { category: activeCategory };
+      const response = await axios.get("http://localhost:5000/api/dashboard/user", {
+        params,
+        headers: getAuthHeaders(),
+      });
+      const sections = response.data;
+      const data = (name) => (sections[name] && sections[name].data) || [];
+      setRecentReports(data("recentReports"));
+      setMyReports(data("myReports"));
+      setWashroomStatus(data("washroomStatus"));
+      setAdminUpdates(data("adminUpdates"));
+      setDiscussions(data("discussions"));
+      if (sections.discussionStats && sections.discussionStats.data) {
+        applyDiscussionStats(sections.discussionStats.data);
+      }
+    } catch (error) {
+      console.error("Error fetching dashboard:", error);
+    }
+  };
+
+  const applyDiscussionStats = (stats) => {
+    setCategories([
+      { name: "All Posts", count: stats["All Posts"] || 0 },
+      { name: "Hygiene", count: stats["Hygiene"] || 0 },
+      { name: "Privacy", count: stats["Privacy"] || 0 },
+      { name: "Urgent", count: stats["Urgent"] || 0 },
+      { name: "Suggestions", count: stats["Suggestions"] || 0 },
+      { name: "Appreciation", count: stats["Appreciation"] || 0 },
+      { name: "Feedback", count: stats["Feedback"] || 0 },
+    ]);
+  };
+
   const fetchDiscussionStats = async () => {
     try {
       const response = await axios.get("http://localhost:5000/api/discussions/stats");
-      const stats = response.data;
-      setCategories([
-        { name: "All Posts", count: stats["All Posts"] || 0 },
-        { name: "Hygiene", count: stats["Hygiene"] || 0 },
-        { name: "Privacy", count: stats["Privacy"] || 0 },
-        { name: "Urgent", count: stats["Urgent"] || 0 },
-        { name: "Suggestions", count: stats["Suggestions"] || 0 },
-        { name: "Appreciation", count: stats["Appreciation"] || 0 },
-        { name: "Feedback", count: stats["Feedback"] || 0 },
-      ]);
+      applyDiscussionStats(response.data);
     } catch (error) {
       console.error("Error fetching discussion stats:", error);
     }